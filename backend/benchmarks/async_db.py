@@ -0,0 +1,164 @@
+"""Concurrent throughput of the old sync-Session routes vs the AsyncSession ones.
+
+Both apps run the same vote listing query against a seeded scratch database:
+"sync" is the previous pattern (``async def`` route + blocking ``Session``),
+"async" uses ``AsyncSession`` the way the routers do now. A cheap ``/ping``
+route is hit alongside to show how long the event loop stays blocked.
+
+    cd backend && python -m benchmarks.async_db --votes 200000 --requests 400 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from database.database import Base, Referendum, User, Vote
+
+REFERENDUMS = 20
+
+
+def seed(path: str, votes: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "username": "bench", "email": "bench@example.com", "hashed_password": "x"}])
+        conn.execute(insert(Referendum), [
+            {"id": i, "title": f"Referendum {i}", "description": "", "creator_id": 1}
+            for i in range(1, REFERENDUMS + 1)
+        ])
+        conn.execute(insert(Vote), [
+            {"user_id": 1, "referendum_id": i % REFERENDUMS + 1, "vote_value": i % 3 == 0}
+            for i in range(votes)
+        ])
+    engine.dispose()
+
+
+def votes_query(referendum_id: int):
+    # Unindexed aggregate over the referendum's votes: the kind of query that
+    # holds the event loop for tens of milliseconds when run synchronously
+    return select(func.count(Vote.id), func.sum(Vote.vote_value)).where(Vote.referendum_id == referendum_id)
+
+
+def build_sync_app(path: str, pool_size: int) -> FastAPI:
+    # The pool must cover every in-flight request: a blocking checkout on the
+    # event loop would otherwise deadlock against sessions waiting to close.
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=pool_size
+    )
+    SessionLocal = sessionmaker(bind=engine)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/votes/{referendum_id}")
+    async def list_votes(referendum_id: int, db: Session = Depends(get_db)):
+        return list(db.execute(votes_query(referendum_id)).one())
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    return app
+
+
+def build_async_app(path: str, pool_size: int) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=pool_size)
+    AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/votes/{referendum_id}")
+    async def list_votes(referendum_id: int, db: AsyncSession = Depends(get_async_db)):
+        return list((await db.execute(votes_query(referendum_id))).one())
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    return app
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    ping_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(f"/votes/{i % REFERENDUMS + 1}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        async def pinger(done: asyncio.Event):
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/ping")
+                ping_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.005)
+
+        done = asyncio.Event()
+        ping_task = asyncio.create_task(pinger(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    latencies.sort()
+    ping_latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "pings_served": len(ping_latencies),
+        "ping_max_ms": round(max(ping_latencies) * 1000, 2) if ping_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.votes)
+        report = {
+            "sync_session": asyncio.run(
+                drive(build_sync_app(path, args.concurrency), args.requests, args.concurrency)
+            ),
+            "async_session": asyncio.run(
+                drive(build_async_app(path, args.concurrency), args.requests, args.concurrency)
+            ),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Checks that the hot API queries are answered from an index.
+
+Builds a scratch SQLite database with ``create_all`` and the migrations (or
+uses ``--database`` to inspect an existing file), runs ``EXPLAIN QUERY PLAN``
+for the queries the routers issue and fails when one of them scans a whole
+table or misses the index it is expected to use.
+
+    cd backend && python -m benchmarks.explain_indexes [--database database/referendum.db]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import Optional
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+
+from database.database import Base, Referendum, ReferendumTag, ReferendumTally, Tag, Vote
+from database.migrations import run_migrations
+
+PAGE = 101
+
+# (name, statement, index the plan must mention)
+HOT_QUERIES = [
+    ("get_votes by referendum",
+     select(Vote).where(Vote.referendum_id == 1).order_by(Vote.id).limit(PAGE),
+     "ix_votes_referendum_id"),
+    ("get_votes by user",
+     select(Vote).where(Vote.user_id == 1).order_by(Vote.id).limit(PAGE),
+     "ix_votes_user_referendum"),
+    ("create_vote duplicate check",
+     select(Vote.id).where(Vote.user_id == 1, Vote.referendum_id == 1),
+     "ix_votes_user_referendum"),
+    ("get_referendums by creator",
+     select(Referendum).where(Referendum.creator_id == 1).order_by(Referendum.id).limit(PAGE),
+     "ix_referendums_creator_id"),
+    ("get_referendums by status",
+     select(Referendum).where(Referendum.status == "approved").order_by(Referendum.id).limit(PAGE),
+     "ix_referendums_status"),
+    ("get_referendums by tag (ids from the tag index)",
+     select(Referendum).where(Referendum.id.in_([1, 2, 3])).order_by(Referendum.id),
+     None),
+    ("create_tag name check",
+     select(Tag).where(Tag.name == "budget"),
+     "ix_tags_name"),
+    ("delete_tag usage check",
+     select(ReferendumTag).where(ReferendumTag.tag_id == 1),
+     "ix_referendum_tags_tag_id"),
+    ("referendum results",
+     select(ReferendumTally).where(ReferendumTally.referendum_id.in_([1, 2, 3])),
+     None),
+]
+
+
+def explain(conn, stmt) -> list:
+    sql = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    return [row.detail for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def plan_problems(plan: list, expected_index: Optional[str]) -> list:
+    """Steps that scan a table, plus a note when ``expected_index`` is unused."""
+    problems = [step for step in plan if not step.startswith(("SEARCH ", "USE TEMP B-TREE"))]
+    if expected_index and not any(expected_index in step for step in plan):
+        problems.append(f"{expected_index} not used")
+    return problems
+
+
+def check(engine) -> bool:
+    ok = True
+    with engine.connect() as conn:
+        for name, stmt, expected_index in HOT_QUERIES:
+            try:
+                plan = explain(conn, stmt)
+            except OperationalError as e:
+                plan = [str(e.orig)]
+                conn.rollback()
+            problems = plan_problems(plan, expected_index)
+            ok = ok and not problems
+            print(f"{'FAIL' if problems else 'ok':<5} {name}")
+            for step in plan:
+                print(f"        {step}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="Existing SQLite file to inspect (default: fresh scratch database)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database:
+            engine = create_engine(f"sqlite:///file:{os.path.abspath(args.database)}?mode=ro&uri=true")
+        else:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'plans.db')}")
+            Base.metadata.create_all(bind=engine)
+            run_migrations(engine)
+        ok = check(engine)
+        engine.dispose()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
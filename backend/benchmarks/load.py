@@ -0,0 +1,352 @@
+"""Load test of the real routers against a database made by ``benchmarks.seed``.
+
+Drivers:
+  inprocess     requests go straight into ``main.app`` through httpx's ASGI
+                transport: no sockets, measures the application itself
+  multiprocess  starts uvicorn (``--workers``) on the database and hits it
+                from ``--processes`` client processes over HTTP
+
+Every run works on a copy of the seeded file, so runs are repeatable. The
+report has throughput and p50/p95/p99 latency per endpoint plus the commit
+it was taken on; ``--compare`` puts it next to an earlier report.
+
+    cd backend && python -m benchmarks.seed --database /tmp/bench.db
+    cd backend && python -m benchmarks.load --database /tmp/bench.db --output before.json
+    cd backend && python -m benchmarks.load --database /tmp/bench.db --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Context:
+    """Dataset description plus per-process state shared by the request builders."""
+
+    def __init__(self, meta: dict, run_id: str):
+        self.meta = meta
+        self.run_id = run_id
+        self.fresh_first, self.fresh_last = meta["fresh_users"]
+        self._tokens: Dict[int, str] = {}
+
+    def token(self, user_id: int) -> str:
+        token = self._tokens.get(user_id)
+        if token is None:
+            # Imported lazily: the app modules read DATABASE_URL at import time
+            from routers.user import create_access_token
+
+            token = create_access_token({"sub": str(user_id), "role": "user"}, timedelta(hours=1))
+            self._tokens[user_id] = token
+        return token
+
+
+# i -> (method, url, httpx request kwargs); i is unique across all client processes
+Request = Tuple[str, str, dict]
+
+
+def login_for_token(i: int, ctx: Context) -> Request:
+    user_id = 1 + i % max(ctx.meta["login_users"], 1)
+    return "POST", "/users/token", {"auth": (f"bench{user_id}", ctx.meta["password"])}
+
+
+def create_vote(i: int, ctx: Context) -> Request:
+    # Walks the fresh users across the open referendums: every (user, referendum) pair once
+    fresh = ctx.fresh_last - ctx.fresh_first + 1
+    user_id = ctx.fresh_first + i % fresh
+    open_ids = ctx.meta.get("active_referendums") or range(1, ctx.meta["referendums"] + 1)
+    referendum_id = open_ids[(i // fresh) % len(open_ids)]
+    return "POST", "/votes/", {
+        "json": {"referendum_id": referendum_id, "vote_value": i % 2 == 0},
+        "headers": {"Authorization": f"Bearer {ctx.token(user_id)}"},
+    }
+
+
+def get_referendums(i: int, ctx: Context) -> Request:
+    after = (i * 37) % ctx.meta["referendums"]
+    return "GET", f"/referendums/?limit=50&after={after}&expand=creator,tags,results", {}
+
+
+def get_referendums_by_status(i: int, ctx: Context) -> Request:
+    return "GET", f"/referendums/?status=active&limit=100&after={(i * 37) % ctx.meta['referendums']}", {}
+
+
+def get_votes(i: int, ctx: Context) -> Request:
+    return "GET", f"/votes/?referendum_id={1 + i % ctx.meta['referendums']}&limit=100", {}
+
+
+def get_referendum_results(i: int, ctx: Context) -> Request:
+    return "GET", f"/referendums/{1 + i % ctx.meta['referendums']}/results", {}
+
+
+def get_tags(i: int, ctx: Context) -> Request:
+    return "GET", "/tags/", {}
+
+
+def get_referendums_tags(i: int, ctx: Context) -> Request:
+    first = 1 + (i * 10) % ctx.meta["referendums"]
+    ids = ",".join(str(1 + (first + k) % ctx.meta["referendums"]) for k in range(10))
+    return "GET", f"/tags/referendums?ids={ids}", {}
+
+
+def create_tag(i: int, ctx: Context) -> Request:
+    return "POST", "/tags/", {"json": {"name": f"load-{ctx.run_id}-{i}"}}
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[int, Context], Request]
+    # Share of --requests this scenario runs (bcrypt-bound logins get fewer)
+    weight: float = 1.0
+
+
+SCENARIOS = [
+    Scenario("login_for_token", login_for_token, 0.25),
+    Scenario("create_vote", create_vote),
+    Scenario("get_referendums", get_referendums),
+    Scenario("get_referendums_by_status", get_referendums_by_status),
+    Scenario("get_votes", get_votes),
+    Scenario("get_referendum_results", get_referendum_results),
+    Scenario("get_tags", get_tags),
+    Scenario("get_referendums_tags", get_referendums_tags),
+    Scenario("create_tag", create_tag, 0.5),
+]
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, ctx: Context, indices: range, concurrency: int):
+    """Sends the requests for ``indices`` and returns (latencies, errors, elapsed)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        method, url, kwargs = scenario.build(i, ctx)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+        if failed:
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in indices))
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def use_database(path: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+
+async def run_inprocess(scenarios: List[Scenario], ctx: Context, requests: int, concurrency: int) -> dict:
+    import main
+
+    report = {}
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for scenario in scenarios:
+                count = max(1, int(requests * scenario.weight))
+                report[scenario.name] = summarize(*await drive(client, scenario, ctx, range(count), concurrency))
+    return report
+
+
+def _client_process(job: tuple):
+    base_url, scenario_name, meta, run_id, start, stop, concurrency, database = job
+    use_database(database)
+    sys.path.insert(0, BACKEND_DIR)
+    ctx = Context(meta, run_id)
+    scenario = SCENARIOS_BY_NAME[scenario_name]
+
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            return await drive(client, scenario, ctx, range(start, stop), concurrency)
+
+    return asyncio.run(run())
+
+
+def start_server(database: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}")
+    env.pop("ASYNC_DATABASE_URL", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become ready in time")
+
+
+def run_multiprocess(
+    scenarios: List[Scenario], ctx: Context, database: str, requests: int, concurrency: int,
+    processes: int, workers: int, port: int,
+) -> dict:
+    server = start_server(database, port, workers)
+    report = {}
+    try:
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            for scenario in scenarios:
+                count = max(processes, int(requests * scenario.weight))
+                bounds = [count * p // processes for p in range(processes + 1)]
+                jobs = [
+                    (f"http://127.0.0.1:{port}", scenario.name, ctx.meta, ctx.run_id,
+                     bounds[p], bounds[p + 1], max(1, concurrency // processes), database)
+                    for p in range(processes)
+                ]
+                started = time.perf_counter()
+                parts = pool.map(_client_process, jobs)
+                elapsed = time.perf_counter() - started
+                latencies = [latency for part in parts for latency in part[0]]
+                report[scenario.name] = summarize(latencies, sum(part[1] for part in parts), elapsed)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return report
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Prints both reports side by side and returns the regressed endpoints."""
+    regressions = []
+    for key in ("driver", "concurrency", "processes", "workers", "dataset"):
+        if report["meta"].get(key) != baseline.get("meta", {}).get(key):
+            print(f"warning: {key} differs from the baseline, numbers are not directly comparable")
+    print(f"{'endpoint':<28}{'rps before':>12}{'rps now':>10}{'p99 before':>12}{'p99 now':>10}")
+    for name, now in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>12}{now['throughput_rps']:>10}{'-':>12}{now['p99_ms']:>10}")
+            continue
+        slower = now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance)
+        laggier = now["p99_ms"] > before["p99_ms"] * (1 + tolerance)
+        flag = "  REGRESSION" if slower or laggier else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28}{before['throughput_rps']:>12}{now['throughput_rps']:>10}"
+              f"{before['p99_ms']:>12}{now['p99_ms']:>10}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="Database created by benchmarks.seed")
+    parser.add_argument("--driver", choices=("inprocess", "multiprocess"), default="inprocess")
+    parser.add_argument("--scenarios", help=f"Comma separated subset of: {', '.join(SCENARIOS_BY_NAME)}")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario (times its weight)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="Client processes (multiprocess)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (multiprocess)")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", help="Write the JSON report here as well")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown with --compare")
+    args = parser.parse_args()
+    # All the load comes from one client, which the rate limiter would throttle
+    # (set RATE_LIMIT_ENABLED=1 to measure the limiter itself)
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        scenarios = [SCENARIOS_BY_NAME[name.strip()] for name in args.scenarios.split(",")]
+    with open(f"{args.database}.json") as f:
+        meta = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "load.db")
+        shutil.copyfile(args.database, database)
+        use_database(database)
+        ctx = Context(meta, uuid.uuid4().hex[:8])
+        if args.driver == "inprocess":
+            sys.path.insert(0, BACKEND_DIR)
+            endpoints = asyncio.run(run_inprocess(scenarios, ctx, args.requests, args.concurrency))
+        else:
+            endpoints = run_multiprocess(
+                scenarios, ctx, database, args.requests, args.concurrency,
+                args.processes, args.workers, args.port,
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "driver": args.driver,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "processes": args.processes if args.driver == "multiprocess" else 1,
+            "workers": args.workers if args.driver == "multiprocess" else 1,
+            "dataset": {key: meta[key] for key in ("users", "referendums", "tags", "votes")},
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Latency of the full-text referendum search against the LIKE scan it replaces.
+
+Runs the statement ``GET /referendums/search`` issues for a few query shapes
+(a rare and a common word, a two letter prefix, two words, a tag filter and
+the second page) against a database seeded by ``benchmarks.seed`` and prints
+p50/p95/max per shape, next to ``title LIKE '%word%' OR description LIKE ...``
+for the plain word queries.
+
+    cd backend && python -m benchmarks.seed --database /tmp/search.db --referendums 1000000 --votes 100000
+    cd backend && python -m benchmarks.search --database /tmp/search.db
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import create_engine, or_, select
+
+from benchmarks.seed import FILLER
+from database.database import Referendum, ReferendumTag
+from database.search import fts_query, search_statement
+
+PAGE = 100
+
+
+def fts_shape(text: str, prefix: bool = True, tag_id: int = None, second_page: bool = False):
+    def run(conn):
+        conditions = []
+        if tag_id is not None:
+            conditions.append(Referendum.id.in_(
+                select(ReferendumTag.referendum_id).where(ReferendumTag.tag_id == tag_id)
+            ))
+        query = fts_query(text, prefix)
+        rows = conn.execute(search_statement(query, None, PAGE + 1, conditions)).all()
+        if second_page and len(rows) > PAGE:
+            last = rows[PAGE - 1]
+            rows = conn.execute(search_statement(query, (last.rank, last.id), PAGE + 1, conditions)).all()
+        return len(rows)
+    return run
+
+
+def like_shape(word: str):
+    def run(conn):
+        pattern = f"%{word}%"
+        stmt = select(Referendum).where(
+            or_(Referendum.title.like(pattern), Referendum.description.like(pattern))
+        ).order_by(Referendum.id).limit(PAGE + 1)
+        return len(conn.execute(stmt).all())
+    return run
+
+
+SHAPES = [
+    # The least frequent description word of the seeded vocabulary
+    ("rare word", fts_shape(FILLER[-1], prefix=False)),
+    ("common word", fts_shape("budget", prefix=False)),
+    ("prefix 'ho'", fts_shape("ho")),
+    ("two words, prefix", fts_shape("school bic")),
+    ("word + tag", fts_shape("budget", prefix=False, tag_id=1)),
+    ("common word, pages 1 and 2", fts_shape("budget", prefix=False, second_page=True)),
+    ("LIKE rare word", like_shape(FILLER[-1])),
+    ("LIKE common word", like_shape("budget")),
+]
+
+
+def measure(conn, run, repeat: int) -> dict:
+    run(conn)  # warm up the page cache
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = run(conn)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "rows": rows,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="SQLite file seeded by benchmarks.seed")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--skip-like", action="store_true", help="Leave out the (slow) LIKE baseline")
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.database}")
+    report = {}
+    with engine.connect() as conn:
+        report["referendums"] = conn.execute(select(Referendum.id).order_by(Referendum.id.desc()).limit(1)).scalar()
+        for name, run in SHAPES:
+            if args.skip_like and name.startswith("LIKE"):
+                continue
+            # LIKE scans the table: a handful of runs is enough to see it
+            repeat = min(args.repeat, 5) if name.startswith("LIKE") else args.repeat
+            report[name] = measure(conn, run, repeat)
+    engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Seeds a SQLite database with a synthetic dataset for the load tests.
+
+Users ``1..users`` are named ``bench<id>`` and share the password
+``--password``; the first ``--login-users`` of them get their own bcrypt hash
+so that logins are not all answered by the credential cache. The last
+``--fresh-users`` users have no votes, which leaves the load generator
+(user, referendum) pairs that can still be voted on. A ``<db>.json`` sidecar
+records the volumes for ``benchmarks.load``.
+
+    cd backend && python -m benchmarks.seed --database /tmp/bench.db --votes 2000000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from database.database import Base, rollup_rebuild_statements
+from database.migrations import run_migrations
+from utils.passwords import get_pwd_context
+
+CHUNK = 50_000
+STATUSES = ("pending", "active", "active", "active", "closed", "cancelled")
+# Titles are drawn from these topics, descriptions mostly from FILLER with
+# Zipf-distributed frequencies, so that the search benchmark sees common
+# words matching a tenth of the table as well as rare ones
+WORDS = (
+    "budget", "school", "park", "library", "tram", "bicycle", "lane", "tax", "water", "energy",
+    "solar", "housing", "rent", "hospital", "clinic", "road", "bridge", "river", "forest", "tree",
+    "zoo", "animal", "shelter", "museum", "theatre", "music", "festival", "market", "square", "parking",
+    "bus", "metro", "airport", "railway", "station", "waste", "recycling", "heating", "air", "quality",
+    "noise", "night", "curfew", "police", "fire", "safety", "playground", "sport", "stadium", "pool",
+    "district", "council", "mayor", "election", "term", "limit", "youth", "senior", "pension", "grant",
+    "farm", "garden", "beach", "lake", "harbour", "tourism", "hotel", "alcohol", "smoking", "dog",
+    "cat", "vaccination", "internet", "broadband", "digital", "office", "permit", "street", "light", "monument",
+)
+
+SYLLABLES = ("ka", "lo", "mi", "ra", "to", "ne", "su", "pa", "de", "vi", "zo", "ba", "ri", "ge", "mu", "fa", "ti", "le", "no", "sa")
+FILLER = [a + b for a in SYLLABLES for b in SYLLABLES] + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+FILLER_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(FILLER) + 1)))
+
+
+def chunked(rows, size: int = CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed(
+    path: str,
+    users: int = 20_000,
+    referendums: int = 500,
+    tags: int = 50,
+    votes: int = 1_000_000,
+    fresh_users: int = 5_000,
+    login_users: int = 32,
+    password: str = "benchpass",
+    seed_value: int = 42,
+) -> dict:
+    voters = users - fresh_users
+    if voters <= 0:
+        raise ValueError("--fresh-users must be smaller than --users")
+    if votes > voters * referendums:
+        raise ValueError(f"At most {voters * referendums} votes fit: one per voter and referendum")
+
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    engine.dispose()
+
+    with ThreadPoolExecutor() as pool:
+        login_hashes = list(pool.map(lambda _: get_pwd_context().hash(password), range(max(login_users, 1))))
+    shared_hash = login_hashes[0]
+
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    with con:
+        con.executemany(
+            "INSERT INTO users (id, username, email, hashed_password, role) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, f"bench{i}", f"bench{i}@example.com",
+                 login_hashes[i - 1] if i <= login_users else shared_hash,
+                 "admin" if i == 1 else "user")
+                for i in range(1, users + 1)
+            ),
+        )
+        now = datetime.utcnow()
+        statuses = [rng.choice(STATUSES) for _ in range(referendums)]
+        con.executemany(
+            "INSERT INTO referendums (id, title, description, start_date, end_date, status, creator_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (i, " ".join(rng.choices(WORDS, k=rng.randint(3, 6))).capitalize(),
+                 " ".join(
+                     rng.choices(FILLER, cum_weights=FILLER_WEIGHTS, k=rng.randint(20, 40))
+                     + rng.choices(WORDS, k=rng.randint(0, 3))
+                 ).capitalize() + ".",
+                 (now - timedelta(days=rng.randint(1, 30))).isoformat(" "),
+                 (now + timedelta(days=rng.randint(1, 30))).isoformat(" "),
+                 statuses[i - 1], rng.randint(1, users))
+                for i in range(1, referendums + 1)
+            ),
+        )
+        con.executemany("INSERT INTO tags (id, name) VALUES (?, ?)", ((i, f"tag{i}") for i in range(1, tags + 1)))
+        if tags:
+            con.executemany(
+                "INSERT INTO referendum_tags (referendum_id, tag_id) VALUES (?, ?)",
+                (
+                    (r, t)
+                    for r in range(1, referendums + 1)
+                    for t in rng.sample(range(1, tags + 1), rng.randint(0, min(4, tags)))
+                ),
+            )
+
+    # Spread the votes over the referendums, each voter at most once per referendum
+    per_referendum = [votes // referendums + (1 if r < votes % referendums else 0) for r in range(referendums)]
+
+    def vote_rows():
+        for r, count in enumerate(per_referendum, start=1):
+            for user_id in rng.sample(range(1, voters + 1), count):
+                voted_at = now - timedelta(seconds=rng.randint(0, 30 * 86400))
+                yield (user_id, r, rng.random() < 0.55, voted_at.isoformat(" "))
+
+    for chunk in chunked(vote_rows()):
+        with con:
+            con.executemany(
+                "INSERT INTO votes (user_id, referendum_id, vote_value, voted_at) VALUES (?, ?, ?, ?)", chunk
+            )
+    with con:
+        con.execute("DELETE FROM referendum_tallies")
+        con.execute(
+            "INSERT INTO referendum_tallies (referendum_id, yes_count, no_count) "
+            "SELECT referendum_id, SUM(vote_value = 1), SUM(vote_value = 0) FROM votes GROUP BY referendum_id"
+        )
+    con.close()
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for stmt in rollup_rebuild_statements("sqlite"):
+            conn.execute(stmt)
+        conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+
+    meta = {
+        "users": users,
+        "referendums": referendums,
+        "tags": tags,
+        "votes": votes,
+        "fresh_users": [voters + 1, users],
+        # Open for voting (until their end_date, 1-30 days after seeding)
+        "active_referendums": [i for i, status in enumerate(statuses, start=1) if status == "active"],
+        "login_users": login_users,
+        "password": password,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    with open(f"{path}.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="SQLite file to (re)create")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--referendums", type=int, default=500)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--votes", type=int, default=1_000_000)
+    parser.add_argument("--fresh-users", type=int, default=5_000, help="Users left without votes")
+    parser.add_argument("--login-users", type=int, default=32, help="Users with their own bcrypt hash")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    meta = seed(
+        args.database, args.users, args.referendums, args.tags, args.votes,
+        args.fresh_users, args.login_users, args.password, args.seed,
+    )
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
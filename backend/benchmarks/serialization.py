@@ -0,0 +1,154 @@
+"""CPU cost of the list responses: ORM objects through the response models
+against plain rows encoded by the fast path.
+
+Two measurements on a database seeded by ``benchmarks.seed``:
+
+* ``encode``: ``--rows`` votes and referendums fetched and turned into JSON
+  bytes in-process. "orm" is what FastAPI does with a ``response_model``
+  (ORM objects validated with ``from_attributes`` and dumped by pydantic),
+  "rows" and "rows+validation" are the paths of ``FAST_LIST_RESPONSES``
+  without and with ``FAST_LIST_VALIDATION``.
+* ``http``: the same number of items read page by page (following
+  ``X-Next-Cursor``) from ``GET /votes/`` and
+  ``GET /referendums/?expand=creator,tags,results`` of the real app.
+
+    cd backend && python -m benchmarks.seed --database /tmp/bench.db --referendums 20000 --votes 200000
+    cd backend && python -m benchmarks.serialization --database /tmp/bench.db --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+MODES = ("orm", "rows", "rows+validation")
+
+
+def timed(run, repeat: int) -> dict:
+    run()  # warm up the page cache and the pydantic validators
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(statistics.median(timings), 2), "min_ms": round(min(timings), 2)}
+
+
+def encode_report(database: str, rows: int, repeat: int) -> dict:
+    from typing import List
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import Session
+
+    from database.database import Referendum as ReferendumModel, User as UserModel, Vote as VoteModel
+    from routers.referendum import REFERENDUM_ROW_COLUMNS, referendum_dicts, referendum_list_adapter
+    from routers.votes import VOTE_FIELDS, VOTE_ROW, vote_list_adapter
+    from schemas.referendum import Referendum
+    from schemas.votes import Vote
+    from utils.serialization import encode_items, rows_to_dicts
+
+    engine = create_engine(f"sqlite:///{database}")
+    vote_rows = select(*[VOTE_FIELDS[name].label(name) for name in VOTE_ROW]).order_by(VoteModel.id).limit(rows)
+    referendum_rows = (
+        select(*[column.label(name) for name, column in REFERENDUM_ROW_COLUMNS.items()])
+        .outerjoin(UserModel, UserModel.id == ReferendumModel.creator_id)
+        .order_by(ReferendumModel.id).limit(rows)
+    )
+
+    def orm(model, schema):
+        adapter = TypeAdapter(List[schema])
+
+        def run():
+            with Session(engine) as session:
+                objects = session.scalars(select(model).order_by(model.id).limit(rows)).all()
+                return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+        return run
+
+    def plain(stmt, to_dicts, adapter=None):
+        def run():
+            with engine.connect() as conn:
+                return encode_items(to_dicts(conn.execute(stmt).all()), adapter)
+        return run
+
+    to_votes = lambda fetched: rows_to_dicts(fetched, VOTE_ROW)  # noqa: E731
+    shapes = {
+        "votes": (
+            orm(VoteModel, Vote),
+            plain(vote_rows, to_votes),
+            plain(vote_rows, to_votes, vote_list_adapter),
+        ),
+        "referendums": (
+            orm(ReferendumModel, Referendum),
+            plain(referendum_rows, referendum_dicts),
+            plain(referendum_rows, referendum_dicts, referendum_list_adapter),
+        ),
+    }
+    report = {}
+    for name, runs in shapes.items():
+        outputs = {mode: json.loads(run()) for mode, run in zip(MODES, runs)}
+        report[name] = {mode: timed(run, repeat) for mode, run in zip(MODES, runs)}
+        report[name]["same_json"] = outputs["orm"] == outputs["rows"] == outputs["rows+validation"]
+    engine.dispose()
+    return report
+
+
+async def http_report(rows: int, repeat: int) -> dict:
+    import httpx
+
+    import config
+    from main import app
+    from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+
+    async def read_all(client, path: str):
+        params = {"limit": MAX_PAGE_SIZE}
+        fetched = 0
+        while fetched < rows:
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+            fetched += len(response.json())
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+            params["after"] = cursor
+        return fetched
+
+    report = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, path in (("votes", "/votes/"), ("referendums", "/referendums/?expand=creator,tags,results")):
+            report[name] = {}
+            for mode in MODES:
+                config.FAST_LIST_RESPONSES = mode != "orm"
+                config.FAST_LIST_VALIDATION = mode == "rows+validation"
+                await read_all(client, path)
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    fetched = await read_all(client, path)
+                    timings.append((time.perf_counter() - started) * 1000)
+                report[name][mode] = {"items": fetched, "p50_ms": round(statistics.median(timings), 2)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="SQLite file seeded by benchmarks.seed")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # Before the app modules are imported: they read the configuration once
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+    os.environ["RESPONSE_CACHE"] = "off"
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    report = {"rows": args.rows, "encode": encode_report(args.database, args.rows, args.repeat)}
+    report["http"] = asyncio.run(http_report(args.rows, args.repeat))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Time to first request of a fresh worker, and where its startup goes.
+
+Starts ``uvicorn main:app`` the way an autoscaled worker comes up (schema
+already migrated, nothing preloaded), polls ``GET /`` until it answers and
+prints:
+
+* the time to first request, median of ``--runs`` starts, against the
+  budget (``STARTUP_BUDGET_MS`` unless ``--budget-ms`` is given);
+* the slowest modules and top-level packages of one ``-X importtime`` start
+  (that start itself is slower, it only shows the breakdown);
+* the phases the app logs with ``STARTUP_REPORT=1`` (imports, app setup,
+  server, lifespan).
+
+Exits with status 1 when the median is over the budget.
+
+    cd backend && python -m benchmarks.startup --database /tmp/bench.db
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+import httpx
+
+import config
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+REPORT_LINE = re.compile(r"Startup report: (\{.*\})")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_once(env: dict, importtime: bool, timeout: float) -> Tuple[float, str]:
+    """Milliseconds from spawning the worker to its first answer, and its output."""
+    port = free_port()
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []),
+               "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    with tempfile.TemporaryFile() as output:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, env=env, stdout=output, stderr=subprocess.STDOUT)
+        try:
+            elapsed = None
+            while time.perf_counter() - started < timeout:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                        elapsed = (time.perf_counter() - started) * 1000
+                        break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        break
+                    time.sleep(0.005)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        output.seek(0)
+        log = output.read().decode("utf-8", "replace")
+    if elapsed is None:
+        raise RuntimeError(f"The worker did not answer within {timeout} s:\n{log[-2000:]}")
+    return elapsed, log
+
+
+def import_breakdown(log: str, top: int) -> dict:
+    modules: List[Tuple[int, str]] = []
+    packages = defaultdict(int)
+    for line in log.splitlines():
+        found = IMPORT_LINE.match(line)
+        if found:
+            self_us, name = int(found.group(1)), found.group(4)
+            modules.append((self_us, name))
+            packages[name.split(".")[0]] += self_us
+    modules.sort(reverse=True)
+    return {
+        "total_ms": round(sum(self_us for self_us, _ in modules) / 1000, 1),
+        "packages_ms": {name: round(self_us / 1000, 1)
+                        for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "modules_ms": {name: round(self_us / 1000, 1) for self_us, name in modules[:top]},
+    }
+
+
+def startup_report(log: str) -> Optional[dict]:
+    found = REPORT_LINE.search(log)
+    return json.loads(found.group(1)) if found else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="SQLite file to serve, defaults to DATABASE_URL / database/referendum.db")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Modules and packages listed in the breakdown")
+    parser.add_argument("--budget-ms", type=float, default=config.STARTUP_BUDGET_MS)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for one worker")
+    args = parser.parse_args()
+
+    env = dict(os.environ, STARTUP_REPORT="1", LOG_MODE="development", LOG_LEVEL="INFO")
+    if args.database:
+        env["DATABASE_URL"] = f"sqlite:///{args.database}"
+
+    timings = []
+    reports = []
+    for _ in range(args.runs):
+        elapsed, log = start_once(env, importtime=False, timeout=args.timeout)
+        timings.append(elapsed)
+        reports.append(startup_report(log))
+    _, log = start_once(env, importtime=True, timeout=args.timeout)
+
+    median = statistics.median(timings)
+    print(json.dumps({
+        "time_to_first_request_ms": {
+            "median": round(median, 1), "min": round(min(timings), 1), "max": round(max(timings), 1),
+            "budget": args.budget_ms,
+        },
+        # The run closest to the median
+        "startup_report": reports[min(range(len(timings)), key=lambda i: abs(timings[i] - median))],
+        "imports": import_breakdown(log, args.top),
+    }, indent=2))
+    sys.exit(1 if median > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import config
+from database.database import (
+    AsyncSessionLocal, DeletionJob, ROLLUP_BUCKETS, Referendum, ReferendumResult, ReferendumTag,
+    ReferendumTally, RollupDelta, User, Vote, VoteRollup, bucket_start, bump_index_version, subtract_votes,
+)
+from database.tag_index import tag_index
+
+ACTIVE = ("pending", "running")
+
+# referendum_id -> [yes, no] votes removed from the tally
+TallyDelta = Dict[int, List[int]]
+
+
+class DeletionJobs:
+    """Deletes referendums and users with everything depending on them, in
+    the background.
+
+    The request only records a job in ``deletion_jobs`` (and a referendum
+    gets status "deleting", so it takes no more votes). The votes then go in
+    chunks of ``chunk_size``, each in its own transaction together with the
+    job's progress, so other writers get the database between chunks and no
+    request holds millions of rows. A user's votes are also subtracted from
+    the tallies and rollups; frozen results of closed referendums stay as
+    they are. The last transaction deletes the votes cast meanwhile, the
+    dependent rows (tallies, rollups, results, tag links; a user's
+    referendums lose their creator) and the referendum or user itself.
+
+    "deleting" is not "active", so the vote check refuses the referendum;
+    workers that cached its voting window before notice within the cache
+    TTL. The last transaction waits until ``settle`` seconds after the job
+    was created, by then the votes those workers accepted are written and
+    it has at most one chunk left to delete. Should more turn up, it does
+    not finish but goes back to chunking.
+
+    Jobs are rows, so every worker can report them. A job that made no
+    progress for ``stale_after`` seconds (its worker stopped) is taken over
+    by the next worker that looks; chunks can safely run again.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        chunk_size: int = 5000,
+        pause_ms: float = 10,
+        stale_after: float = 60,
+        settle: float = 0,
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.pause = pause_ms / 1000
+        self.stale_after = stale_after
+        self.settle = settle
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[DeletionJob, TallyDelta], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[DeletionJob, TallyDelta], Awaitable[None]]):
+        """Registers a coroutine awaited after every committed chunk with the
+        job and the votes it took off each tally; ``job.status`` is "done"
+        after the last one."""
+        self._listeners.append(listener)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch(), name="deletion-jobs")
+
+    async def stop(self):
+        """Stops the watcher and the running jobs; they resume after a restart."""
+        tasks = [task for task in (self._task, *self._jobs.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._jobs.clear()
+
+    async def active_job(self, db: AsyncSession, kind: str, target_id: int) -> Optional[DeletionJob]:
+        return await db.scalar(
+            select(DeletionJob)
+            .where(DeletionJob.kind == kind, DeletionJob.target_id == target_id, DeletionJob.status.in_(ACTIVE))
+            .limit(1)
+        )
+
+    async def create(self, db: AsyncSession, kind: str, target_id: int, total: int) -> DeletionJob:
+        """Adds a job to the caller's transaction; ``run`` it after the commit."""
+        now = datetime.utcnow()
+        job = DeletionJob(kind=kind, target_id=target_id, status="pending", total=total, deleted=0,
+                          created_at=now, updated_at=now)
+        db.add(job)
+        await db.flush()
+        return job
+
+    def run(self, job_id: int):
+        task = self._jobs.get(job_id)
+        if task is None or task.done():
+            task = self._jobs[job_id] = asyncio.create_task(self._run(job_id), name=f"deletion-job-{job_id}")
+            task.add_done_callback(lambda _: self._jobs.pop(job_id, None))
+
+    async def _run(self, job_id: int):
+        try:
+            async with self.session_factory() as db:
+                job = await db.get(DeletionJob, job_id)
+                if job is None or job.status not in ACTIVE:
+                    return
+                job.status = "running"
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+            started = datetime.utcnow()
+            while True:
+                while await self._chunk(job):
+                    await asyncio.sleep(self.pause)
+                wait = (job.created_at + timedelta(seconds=self.settle) - datetime.utcnow()).total_seconds()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                if await self._finish(job):
+                    break
+            logger.info(
+                f"Deleted {job.kind} {job.target_id} with {job.deleted} votes "
+                f"in {(datetime.utcnow() - started).total_seconds():.1f} s (job {job_id})"
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Deletion job {job_id} failed: {e}")
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(DeletionJob).where(DeletionJob.id == job_id)
+                        .values(status="failed", error=str(e), updated_at=datetime.utcnow(), finished_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception as error:
+                logger.error(f"Could not mark deletion job {job_id} as failed: {error}")
+
+    async def _delete_votes(self, db: AsyncSession, job: DeletionJob, tallies: TallyDelta) -> int:
+        """Deletes up to ``chunk_size`` votes of the job's target."""
+        if job.kind == "referendum":
+            # The referendum's tally goes as a whole in the last transaction
+            ids = select(Vote.id).where(Vote.referendum_id == job.target_id).limit(self.chunk_size)
+            return (await db.execute(delete(Vote).where(Vote.id.in_(ids.scalar_subquery())))).rowcount
+
+        votes = (await db.execute(
+            select(Vote.id, Vote.referendum_id, Vote.vote_value, Vote.voted_at)
+            .where(Vote.user_id == job.target_id)
+            .limit(self.chunk_size)
+        )).all()
+        if not votes:
+            return 0
+        chunk_tallies: TallyDelta = defaultdict(lambda: [0, 0])
+        rollups: RollupDelta = defaultdict(lambda: [0, 0])
+        for vote in votes:
+            if vote.referendum_id is None or vote.vote_value is None:
+                continue
+            side = 0 if vote.vote_value else 1
+            chunk_tallies[vote.referendum_id][side] += 1
+            if vote.voted_at is not None:
+                for bucket in ROLLUP_BUCKETS:
+                    rollups[(vote.referendum_id, bucket, bucket_start(vote.voted_at, bucket))][side] += 1
+        await db.execute(delete(Vote).where(Vote.id.in_([vote.id for vote in votes])))
+        await subtract_votes(db, chunk_tallies, rollups)
+        for referendum_id, (yes_count, no_count) in chunk_tallies.items():
+            tallies[referendum_id][0] += yes_count
+            tallies[referendum_id][1] += no_count
+        return len(votes)
+
+    async def _progress(self, db: AsyncSession, job: DeletionJob, deleted: int, **values):
+        job.deleted += deleted
+        await db.execute(
+            update(DeletionJob).where(DeletionJob.id == job.id)
+            .values(deleted=DeletionJob.deleted + deleted, updated_at=datetime.utcnow(), **values)
+        )
+
+    async def _chunk(self, job: DeletionJob) -> int:
+        tallies: TallyDelta = defaultdict(lambda: [0, 0])
+        async with self.session_factory() as db:
+            deleted = await self._delete_votes(db, job, tallies)
+            if deleted:
+                await self._progress(db, job, deleted)
+            await db.commit()
+        if tallies:
+            await self._notify(job, tallies)
+        return deleted
+
+    async def _finish(self, job: DeletionJob) -> bool:
+        """The last transaction; False when it found a full chunk of votes
+        left and only committed that."""
+        tallies: TallyDelta = defaultdict(lambda: [0, 0])
+        version = None
+        async with self.session_factory() as db:
+            # Votes that were cast or still in flight while the chunks ran
+            deleted = await self._delete_votes(db, job, tallies)
+            if deleted >= self.chunk_size:
+                await self._progress(db, job, deleted)
+                await db.commit()
+                await self._notify(job, tallies)
+                return False
+            if job.kind == "referendum":
+                for model in (ReferendumTally, ReferendumResult, VoteRollup):
+                    await db.execute(delete(model).where(model.referendum_id == job.target_id))
+                links = await db.execute(delete(ReferendumTag).where(ReferendumTag.referendum_id == job.target_id))
+                version = await bump_index_version(db, "tags") if links.rowcount else None
+                await db.execute(delete(Referendum).where(Referendum.id == job.target_id))
+            else:
+                await db.execute(update(Referendum).where(Referendum.creator_id == job.target_id).values(creator_id=None))
+                await db.execute(delete(User).where(User.id == job.target_id))
+            now = datetime.utcnow()
+            await self._progress(db, job, deleted, status="done", finished_at=now)
+            await db.commit()
+        if job.kind == "referendum":
+            # Right after the commit, before the refresh task can see the new version
+            tag_index.drop_referendum(job.target_id, version)
+        job.status = "done"
+        job.finished_at = now
+        await self._notify(job, tallies)
+        return True
+
+    async def _notify(self, job: DeletionJob, tallies: TallyDelta):
+        for listener in self._listeners:
+            try:
+                await listener(job, tallies)
+            except Exception as e:
+                logger.warning(f"Deletion job listener failed: {e}")
+
+    async def _watch(self):
+        """Runs the jobs left behind by a stopped worker."""
+        while True:
+            try:
+                await self.resume_stale()
+            except Exception as e:
+                logger.warning(f"Checking for stale deletion jobs failed: {e}")
+            await asyncio.sleep(self.stale_after)
+
+    async def resume_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        async with self.session_factory() as db:
+            stale = (await db.execute(
+                select(DeletionJob.id, DeletionJob.updated_at)
+                .where(DeletionJob.status.in_(ACTIVE), DeletionJob.updated_at < cutoff)
+            )).all()
+            for job_id, updated_at in stale:
+                if job_id in self._jobs:
+                    continue
+                # Conditional, so that only one of the workers takes the job over
+                claimed = await db.execute(
+                    update(DeletionJob)
+                    .where(DeletionJob.id == job_id, DeletionJob.updated_at == updated_at)
+                    .values(updated_at=datetime.utcnow())
+                )
+                await db.commit()
+                if claimed.rowcount:
+                    logger.info(f"Resuming deletion job {job_id}")
+                    self.run(job_id)
+
+
+async def count_votes(db: AsyncSession, kind: str, target_id: int) -> int:
+    """Votes a new job will delete: the tally of a referendum, a count for a user."""
+    if kind == "referendum":
+        tally = await db.get(ReferendumTally, target_id)
+        return tally.yes_count + tally.no_count if tally else 0
+    return await db.scalar(select(func.count()).select_from(Vote).where(Vote.user_id == target_id)) or 0
+
+
+deletion_jobs = DeletionJobs(
+    AsyncSessionLocal,
+    chunk_size=config.DELETE_CHUNK_SIZE,
+    pause_ms=config.DELETE_CHUNK_PAUSE_MS,
+    stale_after=config.DELETE_JOB_STALE_SECONDS,
+    # Cached voting windows expire, then the last accepted votes get written
+    settle=config.VOTING_WINDOW_CACHE_TTL + config.VOTE_BATCH_DELAY_MS / 1000 + 1,
+)
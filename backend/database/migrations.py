@@ -0,0 +1,203 @@
+"""Schema migrations for databases created by an older version of the models.
+
+``Base.metadata.create_all`` only creates missing tables, so new indexes and
+data fixes on existing tables are shipped here. Every migration runs once, in
+its own transaction, and is recorded in ``schema_migrations``. Migrations
+also run right after ``create_all`` on a fresh database, so they must be
+harmless when the schema is already current (``checkfirst`` / IF NOT EXISTS).
+
+    cd backend && python -m database.migrations [--status]
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from loguru import logger
+from sqlalchemy import Column, DateTime, Integer, String, Table, func, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+import config
+from database.database import (
+    Base, Referendum, ReferendumResult, ReferendumTag, ReferendumTally, Tag, Vote, VoteRollup,
+    rollup_rebuild_statements, tally_rebuild_statements,
+)
+from database.search import FTS_STATEMENTS
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(upgrade: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+    return register
+
+
+def create_index(conn: Connection, model, name: str):
+    """Creates the model's index ``name`` unless the database already has it."""
+    index = next(index for index in model.__table__.indexes if index.name == name)
+    index.create(bind=conn, checkfirst=True)
+
+
+@migration(1, "Remove duplicate votes and enforce one vote per user and referendum")
+def _unique_votes(conn: Connection):
+    # Keep the earliest vote of every (user, referendum) pair
+    conn.execute(text(
+        "DELETE FROM votes WHERE user_id IS NOT NULL AND referendum_id IS NOT NULL "
+        "AND id NOT IN (SELECT MIN(id) FROM votes GROUP BY user_id, referendum_id)"
+    ))
+    create_index(conn, Vote, "ix_votes_user_referendum")
+
+
+@migration(2, "Backfill referendum_tallies from votes")
+def _backfill_tallies(conn: Connection):
+    for stmt in tally_rebuild_statements():
+        conn.execute(stmt)
+
+
+@migration(3, "Indexes for the vote, referendum and tag filters")
+def _filter_indexes(conn: Connection):
+    create_index(conn, Vote, "ix_votes_referendum_id")
+    create_index(conn, Referendum, "ix_referendums_creator_id")
+    create_index(conn, Referendum, "ix_referendums_status")
+    create_index(conn, Tag, "ix_tags_name")
+    create_index(conn, ReferendumTag, "ix_referendum_tags_tag_id")
+
+
+@migration(4, "Freeze the results of referendums that are already closed")
+def _freeze_closed_results(conn: Connection):
+    ReferendumResult.__table__.create(bind=conn, checkfirst=True)
+    conn.execute(ReferendumResult.__table__.insert().from_select(
+        ["referendum_id", "yes_count", "no_count", "closed_at"],
+        select(
+            Referendum.id,
+            func.coalesce(ReferendumTally.yes_count, 0),
+            func.coalesce(ReferendumTally.no_count, 0),
+            func.coalesce(Referendum.end_date, func.current_timestamp()),
+        )
+        .outerjoin(ReferendumTally, ReferendumTally.referendum_id == Referendum.id)
+        .outerjoin(ReferendumResult, ReferendumResult.referendum_id == Referendum.id)
+        .where(Referendum.status == "closed", ReferendumResult.referendum_id == None)
+    ))
+
+
+@migration(5, "Full-text search index over referendum titles and descriptions")
+def _referendum_search(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        logger.warning("Full-text search needs SQLite FTS5, skipping the search index")
+        return
+    for statement in FTS_STATEMENTS:
+        conn.execute(text(statement))
+
+
+@migration(6, "Backfill vote_rollups (votes per minute, hour and day) from votes")
+def _backfill_rollups(conn: Connection):
+    VoteRollup.__table__.create(bind=conn, checkfirst=True)
+    for stmt in rollup_rebuild_statements(conn.dialect.name):
+        conn.execute(stmt)
+
+
+@migration(7, "Remove rows orphaned while foreign keys were not enforced")
+def _remove_orphans(conn: Connection):
+    # Deletes used to skip the dependent rows, they would now fail the foreign keys
+    conn.execute(text(
+        "UPDATE referendums SET creator_id = NULL "
+        "WHERE creator_id IS NOT NULL AND creator_id NOT IN (SELECT id FROM users)"
+    ))
+    votes = conn.execute(text(
+        "DELETE FROM votes "
+        "WHERE (user_id IS NOT NULL AND user_id NOT IN (SELECT id FROM users)) "
+        "OR (referendum_id IS NOT NULL AND referendum_id NOT IN (SELECT id FROM referendums))"
+    )).rowcount
+    for table in ("referendum_tags", "referendum_tallies", "referendum_results", "vote_rollups"):
+        conn.execute(text(f"DELETE FROM {table} WHERE referendum_id NOT IN (SELECT id FROM referendums)"))
+    conn.execute(text("DELETE FROM referendum_tags WHERE tag_id NOT IN (SELECT id FROM tags)"))
+    if votes:
+        for stmt in tally_rebuild_statements() + rollup_rebuild_statements(conn.dialect.name):
+            conn.execute(stmt)
+
+
+def applied_versions(engine: Engine) -> List[int]:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return list(conn.scalars(select(schema_migrations.c.version).order_by(schema_migrations.c.version)))
+
+
+def schema_is_current(engine: Engine) -> bool:
+    """True when every model table exists and every migration is applied.
+
+    Two cheap catalog reads, so that restarts and new workers can skip
+    ``create_all`` (one PRAGMA per table on SQLite) and the migrations.
+    """
+    tables = set(inspect(engine).get_table_names())
+    if schema_migrations.name not in tables or not tables.issuperset(Base.metadata.tables):
+        return False
+    with engine.connect() as conn:
+        applied = set(conn.scalars(select(schema_migrations.c.version)))
+    return applied.issuperset(step.version for step in MIGRATIONS)
+
+
+def foreign_keys(conn: Connection, enabled: bool):
+    """Switches SQLite's foreign key enforcement, outside of a transaction."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(f"PRAGMA foreign_keys={'ON' if enabled else 'OFF'}")
+        # Ends the transaction SQLAlchemy began for the pragma (SQLite itself has none open)
+        conn.commit()
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Applies every pending migration in version order and returns their versions."""
+    applied = set(applied_versions(engine))
+    done = []
+    for step in sorted(MIGRATIONS, key=lambda step: step.version):
+        if step.version in applied:
+            continue
+        with engine.connect() as conn:
+            # Steps written before foreign keys were enforced run on data that
+            # may still break them; migration 7 removes those rows
+            foreign_keys(conn, False)
+            try:
+                with conn.begin():
+                    step.upgrade(conn)
+                    conn.execute(insert(schema_migrations).values(
+                        version=step.version, description=step.description, applied_at=datetime.utcnow()
+                    ))
+            finally:
+                foreign_keys(conn, config.SQLITE_FOREIGN_KEYS)
+        logger.info(f"Applied migration {step.version}: {step.description}")
+        done.append(step.version)
+    return done
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database.database import engine
+
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only list applied and pending migrations")
+    args = parser.parse_args()
+
+    if not args.status:
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+    applied = set(applied_versions(engine))
+    for step in sorted(MIGRATIONS, key=lambda step: step.version):
+        state = "applied" if step.version in applied else "pending"
+        print(f"{step.version:>4}  {state:<8} {step.description}")
@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import config
+from database.database import AsyncSessionLocal, Referendum, freeze_results
+from utils.cache import TTLCache
+
+OPEN = "open"
+CLOSE = "close"
+
+
+class ReferendumNotFoundError(Exception):
+    """No referendum with this id."""
+
+
+class VotingClosedError(Exception):
+    """The referendum does not accept votes right now."""
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Dates are stored as naive UTC; aware values from the API are converted."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass
+class VotingWindow:
+    status: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+    def is_open(self, now: datetime) -> bool:
+        """Only active (approved) referendums take votes. Decided from the
+        dates as well, so votes are refused right at ``end_date`` even before
+        the scheduler has flipped the status."""
+        if self.status != "active":
+            return False
+        if self.start_date is not None and now < self.start_date:
+            return False
+        return self.end_date is None or now < self.end_date
+
+
+class ReferendumScheduler:
+    """Closes active referendums at their end date, and opens pending ones
+    at their start date when ``auto_open`` is on (that skips moderation).
+
+    Pending transitions are kept in a heap ordered by time, so the loop only
+    sleeps until the earliest one instead of polling the table. The heap is
+    filled from the database at startup and by ``track`` whenever a
+    referendum is created or changed. Only the latest time of each
+    referendum and action counts; older heap entries are skipped when they
+    come up. Every transition is still a conditional UPDATE that re-checks
+    status and date. When it matches no row, the referendum is reloaded
+    and tracked again, so a date moved meanwhile gets its own entry.
+
+    Closing freezes the tally into ``referendum_results`` in the same
+    transaction. ``ensure_open`` answers the vote check from a per-worker
+    cache of voting windows.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        auto_open: bool = False,
+        close_grace: float = 2,
+        window_ttl: float = 5,
+        window_cache_size: int = 100000,
+    ):
+        self.session_factory = session_factory
+        self.auto_open = auto_open
+        self.close_grace = timedelta(seconds=close_grace)
+        self._windows = TTLCache(window_cache_size, window_ttl)
+        self._heap: List[Tuple[datetime, int, str]] = []
+        # (referendum_id, action) -> time of its current heap entry
+        self._due: Dict[Tuple[int, str], datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[int, str], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[int, str], Awaitable[None]]):
+        """Registers a coroutine awaited with ``(referendum_id, new_status)`` after each transition."""
+        self._listeners.append(listener)
+
+    async def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Referendum.id, Referendum.status, Referendum.start_date, Referendum.end_date)
+                .where(Referendum.status.in_(["pending", "active"]))
+            )
+            for referendum_id, status, start_date, end_date in result:
+                self.track(referendum_id, status, start_date, end_date)
+        logger.info(f"Referendum scheduler started with {len(self._heap)} pending transitions")
+        self._task = asyncio.create_task(self._run(), name="referendum-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def track(self, referendum_id: int, status: str, start_date: Optional[datetime], end_date: Optional[datetime]):
+        """Caches the voting window and schedules the transitions it implies."""
+        start_date, end_date = as_utc(start_date), as_utc(end_date)
+        self._windows.set(referendum_id, VotingWindow(status, start_date, end_date))
+        opens = status == "pending" and self.auto_open and start_date is not None
+        if opens:
+            self._push(start_date, referendum_id, OPEN)
+        # Closing only applies to active referendums, a pending one is queued in case it opens first
+        if (status == "active" or opens) and end_date is not None:
+            self._push(end_date + self.close_grace, referendum_id, CLOSE)
+
+    def forget(self, referendum_id: int):
+        self._windows.pop(referendum_id)
+
+    async def ensure_open(self, referendum_id: int):
+        window = self._windows.get(referendum_id)
+        if window is None:
+            async with self.session_factory() as db:
+                row = (await db.execute(
+                    select(Referendum.status, Referendum.start_date, Referendum.end_date)
+                    .where(Referendum.id == referendum_id)
+                )).first()
+            if row is None:
+                raise ReferendumNotFoundError()
+            window = VotingWindow(row.status, as_utc(row.start_date), as_utc(row.end_date))
+            self._windows.set(referendum_id, window)
+        if not window.is_open(datetime.utcnow()):
+            raise VotingClosedError()
+
+    def _push(self, when: datetime, referendum_id: int, action: str):
+        if self._due.get((referendum_id, action)) == when:
+            return
+        self._due[referendum_id, action] = when
+        if self._heap and when >= self._heap[0][0]:
+            heapq.heappush(self._heap, (when, referendum_id, action))
+            return
+        # New earliest transition: the loop has to re-arm its timer
+        heapq.heappush(self._heap, (when, referendum_id, action))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            when, referendum_id, action = heapq.heappop(self._heap)
+            if self._due.get((referendum_id, action)) != when:
+                continue  # Rescheduled since
+            del self._due[referendum_id, action]
+            try:
+                await self._transition(referendum_id, action)
+            except Exception as e:
+                logger.warning(f"Could not {action} referendum {referendum_id}, retrying in 5s: {e}")
+                self._push(datetime.utcnow() + timedelta(seconds=5), referendum_id, action)
+
+    async def _transition(self, referendum_id: int, action: str):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            if action == OPEN:
+                stmt = update(Referendum).where(
+                    Referendum.id == referendum_id,
+                    Referendum.status == "pending",
+                    Referendum.start_date <= now,
+                ).values(status="active")
+                new_status = "active"
+            else:
+                stmt = update(Referendum).where(
+                    Referendum.id == referendum_id,
+                    Referendum.status == "active",
+                    Referendum.end_date <= now - self.close_grace,
+                ).values(status="closed")
+                new_status = "closed"
+            result = await db.execute(stmt)
+            if not result.rowcount:
+                # Changed meanwhile, or already done by another worker: schedule what the row says now
+                row = (await db.execute(
+                    select(Referendum.status, Referendum.start_date, Referendum.end_date)
+                    .where(Referendum.id == referendum_id)
+                )).first()
+                await db.rollback()
+                self._windows.pop(referendum_id)
+                if row is not None and row.status in ("pending", "active"):
+                    self.track(referendum_id, row.status, row.start_date, row.end_date)
+                return
+            if new_status == "closed":
+                await freeze_results(db, referendum_id)
+            await db.commit()
+        logger.info(f"Referendum {referendum_id} is now {new_status}")
+        # The close of an opened referendum is already in the heap; reload the window on the next vote
+        self._windows.pop(referendum_id)
+        for listener in self._listeners:
+            try:
+                await listener(referendum_id, new_status)
+            except Exception as e:
+                logger.warning(f"Referendum transition listener {listener.__name__} failed: {e}")
+
+
+referendum_scheduler = ReferendumScheduler(
+    AsyncSessionLocal,
+    auto_open=config.REFERENDUM_AUTO_OPEN,
+    close_grace=config.REFERENDUM_CLOSE_GRACE_SECONDS,
+    window_ttl=config.VOTING_WINDOW_CACHE_TTL,
+    window_cache_size=config.VOTING_WINDOW_CACHE_SIZE,
+)
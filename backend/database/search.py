@@ -0,0 +1,106 @@
+"""Full-text search over referendum titles and descriptions (SQLite FTS5).
+
+``referendums_fts`` is an external-content FTS5 index: it stores only the
+index, the text stays in ``referendums``. Triggers keep it in sync with every
+INSERT, DELETE and title/description UPDATE, including bulk imports and
+changes made with plain SQL. Diacritics are folded, so "zwierze" finds
+"zwierzę", and matches in the title weigh ten times more than in the
+description.
+"""
+import re
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import Select, and_, column, literal_column, or_, select, table
+
+from database.database import Referendum
+
+FTS_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS referendums_fts USING fts5("
+    "title, description, content='referendums', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS referendums_fts_insert AFTER INSERT ON referendums BEGIN "
+    "INSERT INTO referendums_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS referendums_fts_delete AFTER DELETE ON referendums BEGIN "
+    "INSERT INTO referendums_fts(referendums_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS referendums_fts_update AFTER UPDATE OF title, description ON referendums BEGIN "
+    "INSERT INTO referendums_fts(referendums_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO referendums_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    # Default ranking of ORDER BY rank: bm25 with the title weighted 10, the description 1
+    "INSERT INTO referendums_fts(referendums_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    "INSERT INTO referendums_fts(referendums_fts) VALUES ('rebuild')",
+]
+
+referendums_fts = table("referendums_fts", column("rowid"), column("rank"))
+
+WORD = re.compile(r"\w+\*?")
+MIN_PREFIX = 2
+
+
+def fts_query(text: str, prefix_last: bool = True) -> Optional[str]:
+    """Turns user input into an FTS5 query in which every word must match.
+
+    Words are quoted, so FTS5 operators in the input are plain text. A word
+    ending in ``*`` matches as a prefix, and so does the last word unless
+    ``prefix_last`` is off (search as you type); one letter words never do.
+    None when there is no word.
+    """
+    words = WORD.findall(text)
+    terms = []
+    for position, word in enumerate(words):
+        word, starred = word.rstrip("*"), word.endswith("*")
+        # A one letter prefix would rank most of the table
+        prefix = (starred or (prefix_last and position == len(words) - 1)) and len(word) >= MIN_PREFIX
+        terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+def parse_search_cursor(cursor: str) -> Tuple[float, int]:
+    rank, referendum_id = cursor.split(",")
+    return float(rank), int(referendum_id)
+
+
+def search_cursor(rank: float, referendum_id: int) -> str:
+    return f"{rank!r},{referendum_id}"
+
+
+def search_statement(
+    query: str,
+    after: Optional[Tuple[float, int]] = None,
+    limit: Optional[int] = None,
+    conditions: Sequence = (),
+) -> Select:
+    """Referendums matching ``query`` with their rank, best first.
+
+    Pages are keyed on (rank, id), so ``after`` is the last row of the
+    previous page. ``conditions`` filter on ``Referendum`` columns. Without
+    them the page is ranked and cut inside the index before any referendum
+    row is read, which matters for common words matching much of the table.
+    """
+    fts = referendums_fts
+    match = literal_column("referendums_fts").op("MATCH")(query)
+    if not conditions:
+        ranked = select(fts.c.rowid, fts.c.rank).where(match)
+        if after is not None:
+            ranked = ranked.where(_after(fts.c.rank, fts.c.rowid, after))
+        ranked = ranked.order_by(fts.c.rank, fts.c.rowid).limit(limit).subquery("ranked")
+        return (
+            select(Referendum, ranked.c.rank)
+            .join(ranked, ranked.c.rowid == Referendum.id)
+            .order_by(ranked.c.rank, Referendum.id)
+        )
+
+    stmt = (
+        select(Referendum, fts.c.rank)
+        .join(fts, fts.c.rowid == Referendum.id)
+        .where(match, *conditions)
+    )
+    if after is not None:
+        stmt = stmt.where(_after(fts.c.rank, Referendum.id, after))
+    return stmt.order_by(fts.c.rank, Referendum.id).limit(limit)
+
+
+def _after(rank, referendum_id, cursor: Tuple[float, int]):
+    last_rank, last_id = cursor
+    return or_(rank > last_rank, and_(rank == last_rank, referendum_id > last_id))
@@ -0,0 +1,228 @@
+import asyncio
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import String, cast, func, select, tuple_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import config
+from database.database import AsyncSessionLocal, IndexVersion, ReferendumTag
+
+INDEX_NAME = "tags"
+LOAD_CHUNK = 50000
+INTERSECT_WINDOW = 4096
+EMPTY = array("I")
+
+
+def _contains(ids: array, value: int) -> bool:
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def _id_list(column, dialect: str):
+    """Comma separated values of ``column`` over the group."""
+    if dialect == "postgresql":
+        return func.string_agg(cast(column, String), ",")
+    return func.group_concat(column)
+
+
+def _key(referendum_id: int, tag_id: int) -> int:
+    return referendum_id << 32 | tag_id
+
+
+class TagIndex:
+    """All tag <-> referendum links, held in memory by every worker.
+
+    Tag -> referendums is a sorted ``array('I')`` of referendum ids per tag;
+    referendum -> tags is one sorted ``array('Q')`` of ``referendum << 32 | tag``
+    keys, a few bytes per link instead of a container per referendum.
+    Multi-tag filters are set intersections or unions over slices of the
+    sorted arrays, and pages are cut by referendum id like the SQL keyset
+    pagination.
+
+    The routers update the index right after committing a link change and
+    bump the ``tags`` row of ``index_versions`` in the same transaction. A
+    background task polls that counter and reloads the index when another
+    worker (or plain SQL) changed the links.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, refresh_interval: float = 5):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self._by_tag: Dict[int, array] = {}
+        self._keys = array("Q")
+        self._version: Optional[int] = None
+        self._load_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._version is not None
+
+    async def start(self):
+        # Loaded in the background so that a large link table does not delay
+        # the first request; the tag queries wait for it in ensure_loaded
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh(), name="tag-index-refresh")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def ensure_loaded(self):
+        if self._version is None:
+            async with self._load_lock:
+                if self._version is None:
+                    await self.load()
+
+    async def load(self):
+        started = time.perf_counter()
+        by_tag: Dict[int, array] = {}
+        keys = array("Q")
+        async with self.session_factory() as db:
+            # All reads share one transaction, so the version matches the links
+            version = await self._read_version(db)
+            # The ids come concatenated, one row per tag or chunk: per-row
+            # driver and ORM overhead made loading millions of links ten times slower
+            dialect = db.bind.dialect.name
+            result = await db.execute(
+                select(ReferendumTag.tag_id, _id_list(ReferendumTag.referendum_id, dialect))
+                .group_by(ReferendumTag.tag_id)
+            )
+            for tag_id, ids in result:
+                by_tag[tag_id] = array("I", sorted(map(int, ids.split(","))))
+            key = ReferendumTag.referendum_id * (1 << 32) + ReferendumTag.tag_id
+            last = (-1, -1)
+            while True:
+                chunk = (
+                    select(key.label("key"))
+                    .where(tuple_(ReferendumTag.referendum_id, ReferendumTag.tag_id) > last)
+                    .order_by(ReferendumTag.referendum_id, ReferendumTag.tag_id)
+                    .limit(LOAD_CHUNK)
+                    .subquery()
+                )
+                packed = await db.scalar(select(_id_list(chunk.c.key, dialect)))
+                if not packed:
+                    break
+                keys.extend(sorted(map(int, packed.split(","))))
+                last = (keys[-1] >> 32, keys[-1] & 0xFFFFFFFF)
+        self._by_tag, self._keys, self._version = by_tag, keys, version
+        logger.info(
+            f"Tag index loaded: {len(keys)} links of {len(by_tag)} tags "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms (version {version})"
+        )
+
+    # --- Updates, called after the link change is committed ---
+
+    def add(self, referendum_id: int, tag_id: int, version: int):
+        ids = self._by_tag.get(tag_id)
+        if ids is None:
+            ids = self._by_tag[tag_id] = array("I")
+        if not _contains(ids, referendum_id):
+            insort(ids, referendum_id)
+            insort(self._keys, _key(referendum_id, tag_id))
+        self._seen(version)
+
+    def remove(self, referendum_id: int, tag_id: int, version: int):
+        ids = self._by_tag.get(tag_id, EMPTY)
+        position = bisect_left(ids, referendum_id)
+        if position < len(ids) and ids[position] == referendum_id:
+            del ids[position]
+            del self._keys[bisect_left(self._keys, _key(referendum_id, tag_id))]
+        self._seen(version)
+
+    def drop_tag(self, tag_id: int, version: Optional[int] = None):
+        for referendum_id in self._by_tag.pop(tag_id, EMPTY):
+            del self._keys[bisect_left(self._keys, _key(referendum_id, tag_id))]
+        if version is not None:
+            self._seen(version)
+
+    def drop_referendum(self, referendum_id: int, version: Optional[int] = None):
+        for tag_id in self.tags_of(referendum_id):
+            # The tag may be gone already (drop_tag), like in remove
+            ids = self._by_tag.get(tag_id, EMPTY)
+            if _contains(ids, referendum_id):
+                del ids[bisect_left(ids, referendum_id)]
+        del self._keys[bisect_left(self._keys, _key(referendum_id, 0)):bisect_left(self._keys, _key(referendum_id + 1, 0))]
+        if version is not None:
+            self._seen(version)
+
+    def _seen(self, version: int):
+        # A gap means another worker changed the links meanwhile: leave the
+        # old version in place so that the next refresh reloads everything
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+
+    # --- Queries ---
+
+    def count(self, tag_id: int) -> int:
+        return len(self._by_tag.get(tag_id, EMPTY))
+
+    def tags_of(self, referendum_id: int) -> List[int]:
+        start = bisect_left(self._keys, _key(referendum_id, 0))
+        end = bisect_left(self._keys, _key(referendum_id + 1, 0))
+        return [key & 0xFFFFFFFF for key in self._keys[start:end]]
+
+    def page(self, tag_ids: Iterable[int], match_all: bool, after: Optional[int], limit: int) -> List[int]:
+        """Up to ``limit`` referendum ids above ``after``, in id order, tagged
+        with all (``match_all``) or any of ``tag_ids``."""
+        lists = [self._by_tag.get(tag_id, EMPTY) for tag_id in dict.fromkeys(tag_ids)]
+        if not lists:
+            return []
+        start = -1 if after is None else after
+        if not match_all:
+            # The first ``limit`` ids of the union are among the first ``limit`` of every tag
+            union = set()
+            for ids in lists:
+                position = bisect_right(ids, start)
+                union.update(ids[position:position + limit])
+            return sorted(union)[:limit]
+
+        # Windows of the smallest array intersected with the matching id
+        # range of the others, so the set operations run in C
+        lists.sort(key=len)
+        smallest, others = lists[0], lists[1:]
+        position = bisect_right(smallest, start)
+        page: List[int] = []
+        while position < len(smallest) and len(page) < limit:
+            window = smallest[position:position + INTERSECT_WINDOW]
+            matches = set(window)
+            for ids in others:
+                matches.intersection_update(
+                    ids[bisect_left(ids, window[0]):bisect_right(ids, window[-1])]
+                )
+                if not matches:
+                    break
+            page.extend(sorted(matches))
+            position += INTERSECT_WINDOW
+        return page[:limit]
+
+    async def _read_version(self, db) -> int:
+        return await db.scalar(select(IndexVersion.version).where(IndexVersion.name == INDEX_NAME)) or 0
+
+    async def _refresh(self):
+        try:
+            await self.ensure_loaded()
+        except Exception as e:
+            logger.warning(f"Tag index load failed, retrying on first use: {e}")
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with self.session_factory() as db:
+                    version = await self._read_version(db)
+                if version != self._version:
+                    async with self._load_lock:
+                        await self.load()
+            except Exception as e:
+                logger.warning(f"Tag index refresh failed: {e}")
+
+
+tag_index = TagIndex(AsyncSessionLocal, refresh_interval=config.TAG_INDEX_REFRESH_SECONDS)
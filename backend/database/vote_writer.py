@@ -0,0 +1,231 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import config
+from database.database import (
+    AsyncSessionLocal, ROLLUP_BUCKETS, RollupDelta, Vote,
+    bucket_start, increment_rollups, increment_tally, insert_ignoring_duplicates,
+)
+
+
+class DuplicateVoteError(Exception):
+    """The user has already voted on this referendum."""
+
+
+class VoteQueueFullError(Exception):
+    """The ingestion queue is full; the caller should retry later."""
+
+
+class VoteTargetMissingError(Exception):
+    """The referendum or the user was deleted while the vote waited."""
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """True for SQLite's and PostgreSQL's foreign key errors, not for other constraints."""
+    orig = error.orig
+    code = getattr(orig, "sqlite_errorname", None) or getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if code is not None:
+        return code in ("SQLITE_CONSTRAINT_FOREIGNKEY", "23503")
+    return "FOREIGN KEY" in str(orig).upper()
+
+
+@dataclass
+class PendingVote:
+    user_id: int
+    referendum_id: int
+    vote_value: bool
+    voted_at: datetime = field(default_factory=datetime.utcnow)
+    future: Optional[asyncio.Future] = None
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (self.user_id, self.referendum_id)
+
+    def as_row(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "referendum_id": self.referendum_id,
+            "vote_value": self.vote_value,
+            "voted_at": self.voted_at,
+        }
+
+
+_STOP = object()
+
+# referendum_id -> [yes, no] votes added by one committed batch
+TallyDelta = Dict[int, List[int]]
+
+
+class VoteWriter:
+    """Writes votes in micro-batches from a single background task.
+
+    ``submit`` queues a vote and resolves once the batch holding it is
+    committed, so the caller still gets a durable acknowledgement. A batch is
+    flushed when it reaches ``max_batch`` votes or ``max_delay_ms`` after its
+    first vote arrived, whichever comes first. Duplicates are detected by the
+    unique (user_id, referendum_id) index: conflicting rows are skipped by the
+    INSERT and reported back as ``DuplicateVoteError``.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        max_batch: int = 500,
+        max_delay_ms: float = 10,
+        max_queue: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[TallyDelta], Awaitable[None]]] = []
+
+    def add_listener(self, listener: Callable[[TallyDelta], Awaitable[None]]):
+        """Registers a coroutine awaited with the tally increments of every commit."""
+        self._listeners.append(listener)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="vote-writer")
+
+    async def stop(self):
+        """Flushes everything already queued, then stops the writer task."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, user_id: int, referendum_id: int, vote_value: bool) -> dict:
+        self.start()
+        vote = PendingVote(user_id, referendum_id, vote_value, future=asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(vote)
+        except asyncio.QueueFull:
+            raise VoteQueueFullError()
+        return await vote.future
+
+    async def write(self, user_id: int, referendum_id: int, vote_value: bool) -> dict:
+        """Writes a single vote right away, in the caller's task."""
+        vote = PendingVote(user_id, referendum_id, vote_value)
+        outcome = (await self._flush([vote]))[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def write_many(self, votes: List[PendingVote]) -> List[Union[dict, Exception]]:
+        """Writes ``votes`` in one transaction, in the caller's task (bulk imports)."""
+        return await self._flush(votes)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            outcomes = await self._flush(batch)
+            for vote, outcome in zip(batch, outcomes):
+                if vote.future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    vote.future.set_exception(outcome)
+                else:
+                    vote.future.set_result(outcome)
+
+    async def _flush(self, batch: List[PendingVote]) -> List[Union[dict, Exception]]:
+        """Inserts ``batch`` and its tally and rollup updates in one transaction."""
+        unique: Dict[Tuple[int, int], PendingVote] = {}
+        for vote in batch:
+            unique.setdefault(vote.key, vote)
+
+        tallies: TallyDelta = defaultdict(lambda: [0, 0])
+        rollups: RollupDelta = defaultdict(lambda: [0, 0])
+        try:
+            async with self.session_factory() as db:
+                stmt = insert_ignoring_duplicates(db, Vote).returning(
+                    Vote.id, Vote.user_id, Vote.referendum_id
+                )
+                result = await db.execute(stmt, [vote.as_row() for vote in unique.values()])
+                inserted = {(row.user_id, row.referendum_id): row.id for row in result}
+
+                for key in inserted:
+                    vote = unique[key]
+                    side = 0 if vote.vote_value else 1
+                    tallies[vote.referendum_id][side] += 1
+                    for bucket in ROLLUP_BUCKETS:
+                        rollups[(vote.referendum_id, bucket, bucket_start(vote.voted_at, bucket))][side] += 1
+                for referendum_id, (yes_count, no_count) in tallies.items():
+                    await increment_tally(db, referendum_id, yes_count, no_count)
+                await increment_rollups(db, rollups)
+                await db.commit()
+        except IntegrityError as e:
+            if not is_foreign_key_violation(e):
+                return [e] * len(batch)
+            # A referendum or user deleted while its vote waited. Retried one
+            # by one, so that it does not fail the votes batched with it.
+            if len(unique) == 1:
+                return [VoteTargetMissingError()] * len(batch)
+            return [(await self._flush([vote]))[0] for vote in batch]
+        except Exception as e:
+            return [e] * len(batch)
+
+        if tallies:
+            await self._notify(tallies)
+
+        outcomes: List[Union[dict, Exception]] = []
+        for vote in batch:
+            vote_id = inserted.get(vote.key)
+            if vote_id is None or unique[vote.key] is not vote:
+                outcomes.append(DuplicateVoteError())
+            else:
+                outcomes.append({"id": vote_id, **vote.as_row()})
+        return outcomes
+
+    async def _notify(self, tallies: TallyDelta):
+        for listener in self._listeners:
+            try:
+                await listener(tallies)
+            except Exception as e:
+                logger.warning(f"Vote commit listener {listener.__name__} failed: {e}")
+
+
+vote_writer = VoteWriter(
+    AsyncSessionLocal,
+    max_batch=config.VOTE_BATCH_SIZE,
+    max_delay_ms=config.VOTE_BATCH_DELAY_MS,
+    max_queue=config.VOTE_QUEUE_SIZE,
+)
@@ -1,13 +1,121 @@
+import json
+import random
 import sys
+import threading
+import traceback
+from collections import deque
 from loguru import logger
 
+import config
+from utils.metrics import Counter
+from utils.request_id import current_request_id
+
+DEV_FORMAT = "<level>{level: <8}</level> <yellow>{name}</yellow>:<yellow>{function}</yellow>:<yellow>{line}</yellow> - <level>{message}</level>"
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} {level: <8} {extra[request_id]} {name}:{function}:{line} - {message}"
+
+dropped_records = Counter("log_records_dropped_total", "Log records dropped because the writer fell behind")
+
+
+def add_request_id(record):
+    record["extra"].setdefault("request_id", current_request_id() or "-")
+
+
+def sample_filter(record) -> bool:
+    """Keeps only a share of the records logged through ``logger.bind(sample=rate)``."""
+    rate = record["extra"].get("sample")
+    return rate is None or rate >= 1 or random.random() < rate
+
+
+def json_line(record) -> str:
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    entry.update(record["extra"])
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    return json.dumps(entry, default=str) + "\n"
+
+
+class BatchingSink:
+    """Loguru sink that moves serialization and I/O off the calling thread.
+
+    ``write`` only appends the record to a buffer. A writer thread wakes up
+    every ``flush_interval`` seconds and writes everything buffered with one
+    write and one flush. When ``max_pending`` records are waiting, new ones
+    are dropped and counted instead of growing memory or blocking requests.
+    """
+
+    def __init__(self, stream, serialize: bool = True, flush_interval: float = 0.1, max_pending: int = 10000):
+        self.stream = stream
+        self.serialize = serialize
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._dropped = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        if len(self._pending) >= self.max_pending:
+            self._dropped += 1
+            dropped_records.inc()
+            return
+        self._pending.append(message.record if self.serialize else str(message))
+
+    def stop(self):
+        """Writes what is still buffered; loguru calls it on ``logger.remove()`` and at exit."""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        lines = []
+        pending = self._pending
+        while pending:
+            item = pending.popleft()
+            lines.append(json_line(item) if self.serialize else item)
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            lines.append(f"WARNING  {dropped} log records dropped, the log writer fell behind\n")
+        if not lines:
+            return
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except Exception as e:
+            print(f"Log writer failed: {e}", file=sys.stderr)
+
 
 def configure_logger():
     logger.remove()
-    logger.add(
-        sys.stdout,
-        level="DEBUG",
-        format="<level>{level: <8}</level> <yellow>{name}</yellow>:<yellow>{function}</yellow>:<yellow>{line}</yellow> - <level>{message}</level>",
+    logger.configure(patcher=add_request_id)
+    if config.LOG_MODE == "production":
+        serialize = config.LOG_FORMAT == "json"
+        logger.add(
+            BatchingSink(sys.stdout, serialize, config.LOG_FLUSH_INTERVAL, config.LOG_MAX_PENDING),
+            level=config.LOG_LEVEL,
+            # The JSON line is built on the writer thread, the format string is not used
+            format="{message}" if serialize else TEXT_FORMAT,
+            filter=sample_filter,
+            backtrace=False,
+            diagnose=False,
+        )
+    else:
+        logger.add(
+            sys.stdout,
+            level=config.LOG_LEVEL,
+            format=DEV_FORMAT,
+            filter=sample_filter,
         )
 
-    return logger
\ No newline at end of file
+    return logger
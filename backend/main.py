@@ -1,54 +1,136 @@
+from utils.startup import StartupTimer
+# Started before the other imports: they are most of a worker's startup
+startup_timer = StartupTimer()
+
 from contextlib import asynccontextmanager
 from datetime import datetime as dt
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from routers import referendum
 from routers import user
 from routers import votes
 from routers import tags
+from routers import admin
+from routers import jobs
 from logger import configure_logger
+import config
 from database import database
+from database.deletions import deletion_jobs
+from database.scheduler import referendum_scheduler
+from database.tag_index import tag_index
+from database.vote_writer import vote_writer
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.metrics import REGISTRY, CONTENT_TYPE
+from utils.passwords import password_hasher
+from utils.rate_limit import RateLimitMiddleware, rate_limiter
+from utils.read_your_writes import ReadYourWritesMiddleware, write_tracker
+from utils.request_id import REQUEST_ID_HEADER, RequestIdMiddleware
+from utils.request_metrics import MetricsMiddleware, instrument_engine
+from utils.response_cache import ResponseCacheMiddleware, response_cache
 
 logger = configure_logger()
 startup_start = dt.now()
+startup_timer.mark("imports")
 logger.info(f"Starting up the server... {startup_start}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    startup_time = (dt.now() - startup_start).total_seconds()*1000
+    startup_timer.mark("server")
+    if config.VOTE_INGEST_MODE == "batched":
+        vote_writer.start()
+    if config.SCHEDULER_ENABLED:
+        await referendum_scheduler.start()
+        startup_timer.mark("scheduler")
+    await tag_index.start()
+    await deletion_jobs.start()
+    startup_timer.mark("lifespan")
+    startup_time = startup_timer.elapsed_ms
     logger.info(f"Server started in {startup_time:.2f} ms")
+    if config.STARTUP_REPORT:
+        logger.info(f"Startup report: {startup_timer.report(config.STARTUP_BUDGET_MS)}")
+    if startup_time > config.STARTUP_BUDGET_MS:
+        logger.warning(f"Startup took {startup_time:.0f} ms, over the budget of {config.STARTUP_BUDGET_MS:.0f} ms")
     yield
     shutdown_start = dt.now()
     logger.info(f"Shutting down the server... {shutdown_start}")
     logger.info(f"Server uptime: {shutdown_start - startup_start}")
+    await referendum_scheduler.stop()
+    await deletion_jobs.stop()
+    await tag_index.stop()
+    await referendum.results_hub.stop()
+    await vote_writer.stop()
+    password_hasher.shutdown()
+    await database.async_engine.dispose()
+    if database.read_async_engine is not None:
+        await database.read_async_engine.dispose()
     
     
 app = FastAPI(
     lifespan=lifespan,
 )
 
+# Innermost: marks the authors of successful writes, whose next reads go to the primary
+app.add_middleware(ReadYourWritesMiddleware, tracker=write_tracker)
+
+# Added early so it runs inside CORS and cached responses get CORS headers too
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, bypass=write_tracker.wrote_recently)
+
+# Outside the response cache so cache hits are counted too, inside CORS so that
+# browsers can read the 429/503 responses and their Retry-After
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, identify=user.decode_access_token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REQUEST_ID_HEADER],
 )
 
+# Outside CORS and the response cache, so cache hits, preflights and errors are measured as well
+if config.METRICS_ENABLED:
+    instrument_engine(database.engine)
+    instrument_engine(database.async_engine.sync_engine)
+    if database.read_async_engine is not None:
+        instrument_engine(database.read_async_engine.sync_engine)
+    app.add_middleware(
+        MetricsMiddleware,
+        server_timing=config.SERVER_TIMING,
+        query_warn=config.QUERY_COUNT_WARN,
+    )
+
+# Outside the metrics so that their warnings carry the request id too
+app.add_middleware(RequestIdMiddleware)
+
+# Health checks and scrapes go through even when the worker sheds load
+rate_limiter.route_cost("GET", "/", 0)
+rate_limiter.route_cost("GET", "/metrics", 0)
+
 @app.get("/")
 def root_handler():
     return {"message": "Hello!"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_handler():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 app.include_router(referendum.router)
 app.include_router(user.router)
 app.include_router(votes.router)
 app.include_router(tags.router)
+app.include_router(admin.router)
+app.include_router(jobs.router)
+startup_timer.mark("app")
 
 
+# Development server; for production use serve.py (several workers, no reload)
 if __name__ == "__main__":
     import uvicorn
-    database.create_tables()
-    logger.info("Database tables created successfully!")
+    if database.create_tables():
+        logger.info("Database tables created successfully!")
+    else:
+        logger.info("Database schema is up to date, nothing to create")
     logger.info("Local mode: Development server started")
     uvicorn.run("main:app", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,268 @@
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Type
+from datetime import datetime
+
+import config
+from database.database import (
+    ReadSessionLocal, freeze_results, get_async_db, insert_ignoring_duplicates, refreeze_results,
+    Referendum as ReferendumModel, User as UserModel, Vote as VoteModel,
+)
+from database.scheduler import as_utc, referendum_scheduler
+from database.vote_writer import vote_writer, DuplicateVoteError, PendingVote, VoteTargetMissingError
+from schemas.admin import ImportSummary
+from schemas.referendum import ReferendumImport
+from schemas.votes import VoteImport
+from routers.user import require_admin
+from utils.bulk import MEDIA_TYPES, iter_records, parse_format, stream_rows
+from utils.rate_limit import rate_limiter
+from utils.response_cache import response_cache
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+for method, path in (("POST", "/admin/votes/import"), ("POST", "/admin/referendums/import"),
+                     ("GET", "/admin/votes/export"), ("GET", "/admin/referendums/export")):
+    rate_limiter.route_cost(method, path, config.RATE_LIMIT_BULK_COST)
+
+VOTE_EXPORT_COLUMNS = {
+    "id": VoteModel.id,
+    "user_id": VoteModel.user_id,
+    "referendum_id": VoteModel.referendum_id,
+    "vote_value": VoteModel.vote_value,
+    "voted_at": VoteModel.voted_at,
+}
+
+REFERENDUM_EXPORT_COLUMNS = {
+    "id": ReferendumModel.id,
+    "title": ReferendumModel.title,
+    "description": ReferendumModel.description,
+    "status": ReferendumModel.status,
+    "start_date": ReferendumModel.start_date,
+    "end_date": ReferendumModel.end_date,
+    "creator_id": ReferendumModel.creator_id,
+}
+
+
+def describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+async def read_chunks(request: Request, schema: Type[BaseModel], fmt: str, summary: ImportSummary):
+    """Validates the streamed rows and yields them in IMPORT_CHUNK_SIZE lists of ``(line, row)``."""
+    chunk = []
+    async for line, record in iter_records(request.stream(), fmt):
+        summary.received += 1
+        if isinstance(record, Exception):
+            summary.reject(line, str(record))
+            continue
+        try:
+            chunk.append((line, schema.model_validate(record)))
+        except ValidationError as e:
+            summary.reject(line, describe(e))
+            continue
+        if len(chunk) >= config.IMPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def existing_ids(db: AsyncSession, column, ids) -> set:
+    if not ids:
+        return set()
+    return set(await db.scalars(select(column).where(column.in_(ids))))
+
+
+def import_failed(summary: ImportSummary, e: Exception) -> HTTPException:
+    # Chunks committed before the failure stay imported
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Import stopped after {summary.inserted} inserted rows: {str(e)}"
+    )
+
+
+@router.post("/votes/import", response_model=ImportSummary)
+async def import_votes(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson or csv, defaults to the Content-Type"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Imports votes (user_id, referendum_id, vote_value, optional voted_at).
+
+    Rows are committed in chunks together with their tally updates. A row for
+    an already voted (user, referendum) pair counts as a duplicate, rows for
+    unknown users or referendums and for referendums being deleted are
+    rejected. Votes on closed referendums are accepted (archives are
+    imported referendums first, votes second) and their frozen results are
+    recomputed from the tally after each chunk.
+    """
+    fmt = parse_format(format, request.headers.get("content-type"))
+    summary = ImportSummary()
+    async for chunk in read_chunks(request, VoteImport, fmt, summary):
+        try:
+            statuses = dict((await db.execute(
+                select(ReferendumModel.id, ReferendumModel.status)
+                .where(ReferendumModel.id.in_({vote.referendum_id for _, vote in chunk}))
+            )).all())
+            user_ids = await existing_ids(db, UserModel.id, {vote.user_id for _, vote in chunk})
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise import_failed(summary, e)
+
+        pending: List[PendingVote] = []
+        lines: List[int] = []
+        for line, vote in chunk:
+            referendum_status = statuses.get(vote.referendum_id)
+            if referendum_status is None:
+                summary.reject(line, f"Referendum {vote.referendum_id} does not exist")
+            elif referendum_status == "deleting":
+                summary.reject(line, f"Referendum {vote.referendum_id} is being deleted")
+            elif vote.user_id not in user_ids:
+                summary.reject(line, f"User {vote.user_id} does not exist")
+            else:
+                pending.append(PendingVote(
+                    vote.user_id, vote.referendum_id, vote.vote_value, as_utc(vote.voted_at) or datetime.utcnow()
+                ))
+                lines.append(line)
+        touched = set()
+        for line, vote, outcome in zip(lines, pending, await vote_writer.write_many(pending)):
+            if isinstance(outcome, DuplicateVoteError):
+                summary.duplicates += 1
+            elif isinstance(outcome, VoteTargetMissingError):
+                summary.reject(line, f"Referendum {vote.referendum_id} or user {vote.user_id} was deleted meanwhile")
+            elif isinstance(outcome, Exception):
+                raise import_failed(summary, outcome)
+            else:
+                summary.inserted += 1
+                touched.add(vote.referendum_id)
+        if not touched:
+            continue
+        try:
+            # Read again: a referendum may have closed while the chunk was written
+            closed = list(await db.scalars(
+                select(ReferendumModel.id).where(ReferendumModel.id.in_(touched), ReferendumModel.status == "closed")
+            ))
+            for referendum_id in closed:
+                await refreeze_results(db, referendum_id)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise import_failed(summary, e)
+        if closed:
+            await response_cache.invalidate("results", *[f"results:{referendum_id}" for referendum_id in closed])
+    return summary
+
+
+async def advance_id_sequence(db: AsyncSession, max_id: int):
+    """Moves the referendum id sequence past ids inserted explicitly.
+
+    PostgreSQL only advances a serial sequence when it hands out the id, so
+    the next row without one would collide with an imported row (and be
+    skipped as a duplicate). SQLite picks MAX(id) + 1 by itself.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return
+    sequence = func.pg_get_serial_sequence(ReferendumModel.__tablename__, "id")
+    # Never moves back: nextval already past max_id keeps its value
+    await db.execute(select(func.setval(sequence, func.greatest(max_id, func.nextval(sequence)))))
+
+
+@router.post("/referendums/import", response_model=ImportSummary)
+async def import_referendums(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson or csv, defaults to the Content-Type"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Imports referendums. Rows with an ``id`` keep it and are skipped as
+    duplicates when it is already taken; rows without one get a new id.
+    Closed referendums get their (empty) result frozen right away."""
+    fmt = parse_format(format, request.headers.get("content-type"))
+    summary = ImportSummary()
+    async for chunk in read_chunks(request, ReferendumImport, fmt, summary):
+        try:
+            creator_ids = await existing_ids(
+                db, UserModel.id, {row.creator_id for _, row in chunk if row.creator_id is not None}
+            )
+            with_id, without_id = [], []
+            for line, row in chunk:
+                if row.creator_id is not None and row.creator_id not in creator_ids:
+                    summary.reject(line, f"User {row.creator_id} does not exist")
+                    continue
+                values = row.model_dump(exclude_none=True)
+                (with_id if row.id is not None else without_id).append(values)
+
+            # executemany needs the same keys on every row, hence one statement per shape
+            inserted = []
+            for rows in (with_id, without_id):
+                if not rows:
+                    continue
+                result = await db.execute(
+                    insert_ignoring_duplicates(db, ReferendumModel).returning(
+                        ReferendumModel.id, ReferendumModel.status, ReferendumModel.start_date, ReferendumModel.end_date
+                    ),
+                    rows,
+                )
+                created = result.all()
+                if rows is with_id and created:
+                    await advance_id_sequence(db, max(row.id for row in created))
+                for row in created:
+                    if row.status == "closed":
+                        # Closed on arrival, the scheduler never freezes these
+                        await freeze_results(db, row.id, row.end_date)
+                inserted.extend(created)
+                summary.inserted += len(created)
+                summary.duplicates += len(rows) - len(created)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise import_failed(summary, e)
+        for row in inserted:
+            referendum_scheduler.track(row.id, row.status, row.start_date, row.end_date)
+    if summary.inserted:
+        await response_cache.invalidate("referendums")
+    return summary
+
+
+def export_response(query, columns: dict, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(ReadSessionLocal, query, list(columns), fmt, config.EXPORT_CHUNK_SIZE),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/votes/export")
+async def export_votes(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    referendum_id: Optional[int] = Query(None, description="Only votes of this referendum"),
+    voted_from: Optional[datetime] = Query(None, description="Only votes cast on or after this date"),
+    voted_to: Optional[datetime] = Query(None, description="Only votes cast on or before this date"),
+):
+    fmt = parse_format(format)
+    query = select(*VOTE_EXPORT_COLUMNS.values()).order_by(VoteModel.id)
+    if referendum_id is not None:
+        query = query.where(VoteModel.referendum_id == referendum_id)
+    if voted_from:
+        query = query.where(VoteModel.voted_at >= voted_from)
+    if voted_to:
+        query = query.where(VoteModel.voted_at <= voted_to)
+    return export_response(query, VOTE_EXPORT_COLUMNS, fmt, "votes")
+
+
+@router.get("/referendums/export")
+async def export_referendums(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Only referendums with this status"),
+):
+    fmt = parse_format(format)
+    query = select(*REFERENDUM_EXPORT_COLUMNS.values()).order_by(ReferendumModel.id)
+    if status_filter:
+        query = query.where(ReferendumModel.status == status_filter)
+    return export_response(query, REFERENDUM_EXPORT_COLUMNS, fmt, "referendums")
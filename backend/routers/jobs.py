@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import DeletionJob, get_read_db
+from schemas.jobs import DeletionJobResponse
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=DeletionJobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Progress of a background deletion started by DELETE /referendums/ or DELETE /users/."""
+    job = await db.get(DeletionJob, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    return job
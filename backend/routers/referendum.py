@@ -1,19 +1,237 @@
-from fastapi import APIRouter, Query, Depends, Body, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import Optional, List
+from fastapi import APIRouter, Query, Depends, Body, HTTPException, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import Iterable, Literal, Optional, List
+from datetime import datetime
+import asyncio
 
-from database.database import get_db, Referendum as ReferendumModel
-from schemas.referendum import Referendum, CreateReferendum, ReferendumUpdate
+import config
+from database.database import AsyncSessionLocal, get_async_db, get_read_db, freeze_results, Referendum as ReferendumModel, ReferendumResult, ReferendumTag, ReferendumTally, Tag as TagModel, User as UserModel, VoteRollup, bucket_start
+from database.deletions import count_votes, deletion_jobs
+from database.scheduler import as_utc, referendum_scheduler
+from database.search import fts_query, parse_search_cursor, search_cursor, search_statement
+from database.tag_index import tag_index
+from database.vote_writer import vote_writer
+from schemas.referendum import Referendum, CreateReferendum, ReferendumUpdate, ReferendumResults, ReferendumTimeline, TimelinePoint
+from schemas.jobs import DeletionJobResponse
+from schemas.tags import TagResponse
+from schemas.user import UserResponse
 from routers.user import get_current_user_id
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PageParams, items_response, paginate, paginate_ids, parse_fields, page_response, set_next_cursor
+from utils.rate_limit import rate_limiter
+from utils.response_cache import response_cache
+from utils.results_hub import HubFullError, ResultsHub
 
 
 router = APIRouter(prefix="/referendums", tags=["referendums"])
 
+MAX_RESULTS_BATCH = 500
+
+EXPANDABLE = ("creator", "tags", "results")
+
+REFERENDUM_FIELDS = {
+    "id": ReferendumModel.id,
+    "title": ReferendumModel.title,
+    "description": ReferendumModel.description,
+    "status": ReferendumModel.status,
+    "start_date": ReferendumModel.start_date,
+    "end_date": ReferendumModel.end_date,
+    "creator_id": ReferendumModel.creator_id,
+}
+
+# Columns of the fast list responses, in the key order of the Referendum
+# schema, followed by the creator's (outer joined) columns
+REFERENDUM_ROW = [name for name in Referendum.model_fields if name in REFERENDUM_FIELDS]
+CREATOR_ROW = list(UserResponse.model_fields)
+REFERENDUM_ROW_COLUMNS = {
+    **{name: REFERENDUM_FIELDS[name] for name in REFERENDUM_ROW},
+    **{f"creator_{name}": getattr(UserModel, name) for name in CREATOR_ROW},
+}
+referendum_list_adapter = TypeAdapter(List[Referendum])
+
+
+def parse_id_list(ids: str) -> List[int]:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma separated list of integers"
+        )
+    if len(parsed) > MAX_RESULTS_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_RESULTS_BATCH} ids can be requested at once"
+        )
+    return parsed
+
+
+def parse_expand(expand: Optional[str]) -> set:
+    if not expand:
+        return set()
+    requested = {name.strip() for name in expand.split(",") if name.strip()}
+    unknown = requested.difference(EXPANDABLE)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot expand: {', '.join(sorted(unknown))}. Allowed: {', '.join(EXPANDABLE)}"
+        )
+    return requested
+
+
+async def fetch_results(db: AsyncSession, referendum_ids: List[int]) -> List[ReferendumResults]:
+    # Closed referendums are answered from their frozen results
+    result = await db.execute(
+        select(
+            ReferendumModel.id,
+            func.coalesce(ReferendumResult.yes_count, ReferendumTally.yes_count),
+            func.coalesce(ReferendumResult.no_count, ReferendumTally.no_count),
+        ).outerjoin(
+            ReferendumResult, ReferendumResult.referendum_id == ReferendumModel.id
+        ).outerjoin(
+            ReferendumTally, ReferendumTally.referendum_id == ReferendumModel.id
+        ).where(ReferendumModel.id.in_(referendum_ids))
+    )
+    rows = result.all()
+    results = []
+    for referendum_id, yes_count, no_count in rows:
+        yes_count = yes_count or 0
+        no_count = no_count or 0
+        results.append(ReferendumResults(
+            referendum_id=referendum_id,
+            yes_count=yes_count,
+            no_count=no_count,
+            total=yes_count + no_count,
+        ))
+    return results
+
+
+async def expand_referendums(
+    db: AsyncSession, referendums: List[ReferendumModel], expansions: set
+) -> List[Referendum]:
+    """Attaches tags (loaded with the page) and vote counts (one extra query)."""
+    results = {}
+    if "results" in expansions and referendums:
+        results = {
+            result.referendum_id: result
+            for result in await fetch_results(db, [referendum.id for referendum in referendums])
+        }
+    expanded = []
+    for referendum in referendums:
+        update = {}
+        if "tags" in expansions:
+            update["tags"] = [TagResponse.model_validate(tag) for tag in referendum.attached_tags]
+        if "results" in expansions:
+            update["results"] = results.get(referendum.id, ReferendumResults(referendum_id=referendum.id))
+        expanded.append(Referendum.model_validate(referendum).model_copy(update=update))
+    return expanded
+
+
+async def referendum_items(db: AsyncSession, rows: list, expansions: set) -> List[dict]:
+    """Loads the expansions of a page of REFERENDUM_ROW_COLUMNS rows and shapes it for the response."""
+    ids = [row.id for row in rows]
+    tags = results = None
+    if "tags" in expansions and ids:
+        tags = {}
+        links = await db.execute(
+            select(ReferendumTag.referendum_id, TagModel.name, TagModel.id)
+            .join(TagModel, TagModel.id == ReferendumTag.tag_id)
+            .where(ReferendumTag.referendum_id.in_(ids))
+            .order_by(TagModel.id)
+        )
+        for referendum_id, name, tag_id in links:
+            tags.setdefault(referendum_id, []).append({"name": name, "id": tag_id})
+    if "results" in expansions and ids:
+        results = {result.referendum_id: result.model_dump() for result in await fetch_results(db, ids)}
+    return referendum_dicts(rows, tags, results)
+
+
+def referendum_dicts(rows: list, tags: Optional[dict] = None, results: Optional[dict] = None) -> List[dict]:
+    """Plain dicts in the shape and key order of the Referendum schema."""
+    width = len(REFERENDUM_ROW)
+    creator_id = CREATOR_ROW.index("id")
+    items = []
+    for row in rows:
+        item = dict(zip(REFERENDUM_ROW, row[:width]))
+        creator = row[width:]
+        item["creator"] = dict(zip(CREATOR_ROW, creator)) if creator[creator_id] is not None else None
+        item["tags"] = tags.get(row.id, []) if tags is not None else None
+        item["results"] = None
+        if results is not None:
+            item["results"] = results.get(row.id) or ReferendumResults(referendum_id=row.id).model_dump()
+        items.append(item)
+    return items
+
+
+async def load_tallies(referendum_ids: Iterable[int]) -> dict:
+    async with AsyncSessionLocal() as db:
+        results = await fetch_results(db, list(referendum_ids))
+    return {result.referendum_id: (result.yes_count, result.no_count) for result in results}
+
+
+results_hub = ResultsHub(
+    load_tallies,
+    max_rate=config.RESULTS_STREAM_MAX_RATE,
+    poll_interval=config.RESULTS_STREAM_POLL_SECONDS,
+    keepalive=config.RESULTS_STREAM_KEEPALIVE,
+    max_subscribers=config.RESULTS_STREAM_MAX_SUBSCRIBERS,
+)
+vote_writer.add_listener(results_hub.notify)
+
+
+async def invalidate_transitioned(referendum_id: int, new_status: str):
+    await response_cache.invalidate("referendums", "results", f"results:{referendum_id}")
+
+
+referendum_scheduler.add_listener(invalidate_transitioned)
+
+
+async def on_deletion_progress(job, tallies: dict):
+    await results_hub.notify(tallies)
+    if job.status != "done":
+        return
+    if job.kind == "referendum":
+        referendum_scheduler.forget(job.target_id)
+    # A deleted user's referendums lost their creator
+    await response_cache.invalidate("referendums", "tags", "results")
+
+
+deletion_jobs.add_listener(on_deletion_progress)
+
+
+def referendum_list_namespaces(path_params: dict, query: dict) -> List[str]:
+    expansions = {name.strip() for name in query.get("expand", "").split(",")}
+    namespaces = ["referendums", "users"]
+    if "tags" in expansions or query.get("tag_id") or query.get("tags") or "tag_id" in path_params:
+        namespaces.append("tags")
+    if "results" in expansions:
+        namespaces.append("results")
+    return namespaces
+
+
+response_cache.cache_route("/referendums/", referendum_list_namespaces)
+response_cache.cache_route("/referendums/search", referendum_list_namespaces)
+response_cache.cache_route("/referendums/results", lambda path_params, query: ["referendums", "results"])
+response_cache.cache_route(
+    "/referendums/{referendum_id}/results",
+    lambda path_params, query: ["referendums", f"results:{path_params['referendum_id']}"],
+)
+response_cache.cache_route(
+    "/referendums/{referendum_id}/timeline",
+    lambda path_params, query: ["referendums", f"results:{path_params['referendum_id']}"],
+)
+# Open for minutes and already capped by RESULTS_STREAM_MAX_SUBSCRIBERS
+rate_limiter.route_cost("GET", "/referendums/{referendum_id}/results/stream", 0)
+
 
 @router.post("/", response_model=Referendum, status_code=status.HTTP_201_CREATED)
 async def create_referendum(
     referendum: CreateReferendum,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user_id: int = Depends(get_current_user_id)
     ):
     try:
@@ -23,11 +241,16 @@ async def create_referendum(
             creator_id=current_user_id,
         )
         db.add(created_referendum)
-        db.commit()
-        db.refresh(created_referendum) 
+        await db.commit()
+        await response_cache.invalidate("referendums")
+        await db.refresh(created_referendum) 
+        referendum_scheduler.track(
+            created_referendum.id, created_referendum.status,
+            created_referendum.start_date, created_referendum.end_date,
+        )
         return created_referendum
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -35,23 +258,66 @@ async def create_referendum(
         
 @router.get("/", response_model=List[Referendum])
 async def get_referendums(
+    response: Response,
     referendum_id: Optional[int] = Query(None, description="ID of the referendum"),
     user_id: Optional[int] = Query(None, description="ID of the user requesting the referendum"),
-    expand: str = Query(None, description="Expand relationships (e.g., creator)"),
-    db: Session = Depends(get_db),
+    expand: Optional[str] = Query(None, description="Comma separated relationships to embed: creator, tags, results"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Only referendums with this status"),
+    tag_id: Optional[int] = Query(None, description="Only referendums tagged with this tag"),
+    tags: Optional[str] = Query(None, description="Comma separated tag IDs, combined with tag_id"),
+    tags_mode: Literal["all", "any"] = Query("all", description="Referendums with all or with any of the tags"),
+    date_from: Optional[datetime] = Query(None, description="Only referendums still running on or after this date"),
+    date_to: Optional[datetime] = Query(None, description="Only referendums starting on or before this date"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,title,status"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
+    selected_fields = parse_fields(fields, REFERENDUM_FIELDS)
+    expansions = parse_expand(expand)
+    tag_ids = ([tag_id] if tag_id else []) + (parse_id_list(tags) if tags else [])
+    fast = config.FAST_LIST_RESPONSES and not selected_fields
     try:
-        query = db.query(ReferendumModel)
-        if expand == "creator":
+        query = select(ReferendumModel)
+        if fast:
+            # The creator is part of every referendum in the response
+            query = query.outerjoin(UserModel, UserModel.id == ReferendumModel.creator_id)
+            selected_fields, columns = list(REFERENDUM_ROW_COLUMNS), REFERENDUM_ROW_COLUMNS
+        else:
+            columns = REFERENDUM_FIELDS
+        if "creator" in expansions and not selected_fields:
             query = query.options(joinedload(ReferendumModel.creator))
+        if "tags" in expansions and not selected_fields:
+            query = query.options(selectinload(ReferendumModel.attached_tags))
         if referendum_id:
-            referendum = query.filter(ReferendumModel.id == referendum_id).first()
-            referendums = [referendum] if referendum else []
+            query = query.where(ReferendumModel.id == referendum_id)
         elif user_id:
-            referendums = query.filter(ReferendumModel.creator_id == user_id).all()
+            query = query.where(ReferendumModel.creator_id == user_id)
+        if status_filter:
+            query = query.where(ReferendumModel.status == status_filter)
+        if date_from:
+            query = query.where(ReferendumModel.end_date >= date_from)
+        if date_to:
+            query = query.where(ReferendumModel.start_date <= date_to)
+        if tag_ids:
+            # Candidate ids come from the tag index, the query filters them
+            await tag_index.ensure_loaded()
+            referendums, next_cursor = await paginate_ids(
+                db, query, ReferendumModel.id, page,
+                lambda after, count: tag_index.page(tag_ids, tags_mode == "all", after, count),
+                selected_fields, columns,
+            )
         else:
-            referendums = query.all()
-        db.expire_all()
+            referendums, next_cursor = await paginate(
+                db, query, ReferendumModel.id, page, selected_fields, columns
+            )
+        if fast:
+            adapter = referendum_list_adapter if config.FAST_LIST_VALIDATION else None
+            return items_response(await referendum_items(db, referendums, expansions), next_cursor, adapter)
+        if selected_fields:
+            return page_response(referendums, selected_fields, next_cursor)
+        set_next_cursor(response, next_cursor)
+        if expansions & {"tags", "results"}:
+            return await expand_referendums(db, referendums, expansions)
         return referendums
     except Exception as e:
         raise HTTPException(
@@ -59,23 +325,270 @@ async def get_referendums(
             detail=str(e)
         )
         
-@router.delete("/", response_model=Referendum)
+@router.get("/search", response_model=List[Referendum])
+async def search_referendums(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Words to find in the title or description, word* matches a prefix"),
+    prefix: bool = Query(True, description="Match the last word as a prefix (search as you type)"),
+    expand: Optional[str] = Query(None, description="Comma separated relationships to embed: creator, tags, results"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Only referendums with this status"),
+    tag_id: Optional[int] = Query(None, description="Only referendums tagged with this tag"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items to return"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page (X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Best matches first (bm25, title matches weigh more)."""
+    expansions = parse_expand(expand)
+    if db.bind.dialect.name != "sqlite":
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Full-text search is only available on SQLite"
+        )
+    match = fts_query(q, prefix)
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="q must contain at least one word"
+        )
+    try:
+        cursor = parse_search_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    try:
+        conditions = []
+        if status_filter:
+            conditions.append(ReferendumModel.status == status_filter)
+        if tag_id:
+            conditions.append(ReferendumModel.id.in_(
+                select(ReferendumTag.referendum_id).where(ReferendumTag.tag_id == tag_id)
+            ))
+        query = search_statement(match, cursor, limit + 1, conditions)
+        if "creator" in expansions:
+            query = query.options(joinedload(ReferendumModel.creator))
+        if "tags" in expansions:
+            query = query.options(selectinload(ReferendumModel.attached_tags))
+        rows = (await db.execute(query)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            set_next_cursor(response, search_cursor(rows[-1].rank, rows[-1][0].id))
+        referendums = [row[0] for row in rows]
+        if expansions & {"tags", "results"}:
+            return await expand_referendums(db, referendums, expansions)
+        return referendums
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.get("/results", response_model=List[ReferendumResults])
+async def get_referendums_results(
+    ids: str = Query(..., description="Comma separated referendum IDs, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    referendum_ids = parse_id_list(ids)
+    if not referendum_ids:
+        return []
+    return await fetch_results(db, referendum_ids)
+
+@router.get("/{referendum_id}/results", response_model=ReferendumResults)
+async def get_referendum_results(
+    referendum_id: int,
+    db: AsyncSession = Depends(get_read_db),
+):
+    results = await fetch_results(db, [referendum_id])
+    if not results:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Referendum with ID {referendum_id} not found"
+        )
+    return results[0]
+
+@router.get("/{referendum_id}/timeline", response_model=ReferendumTimeline)
+async def get_referendum_timeline(
+    referendum_id: int,
+    bucket: Literal["minute", "hour", "day"] = Query("hour", description="Width of one point"),
+    since: Optional[datetime] = Query(None, description="Only buckets ending after this date"),
+    until: Optional[datetime] = Query(None, description="Only buckets starting before this date"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Yes/no votes per time bucket, read from vote_rollups instead of the votes."""
+    if not await db.scalar(select(ReferendumModel.id).where(ReferendumModel.id == referendum_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Referendum with ID {referendum_id} not found"
+        )
+    # The bucket holding ``since`` is included
+    since = bucket_start(as_utc(since), bucket) if since is not None else None
+    until = as_utc(until)
+    conditions = [VoteRollup.referendum_id == referendum_id, VoteRollup.bucket == bucket]
+
+    yes_total = no_total = 0
+    if since is not None:
+        # Running totals start from the votes cast before the range
+        yes_total, no_total = (await db.execute(
+            select(func.coalesce(func.sum(VoteRollup.yes_count), 0), func.coalesce(func.sum(VoteRollup.no_count), 0))
+            .where(*conditions, VoteRollup.bucket_start < since)
+        )).one()
+        conditions.append(VoteRollup.bucket_start >= since)
+    if until is not None:
+        conditions.append(VoteRollup.bucket_start < until)
+
+    rows = (await db.execute(
+        select(VoteRollup.bucket_start, VoteRollup.yes_count, VoteRollup.no_count)
+        .where(*conditions)
+        .order_by(VoteRollup.bucket_start)
+        .limit(config.TIMELINE_MAX_POINTS + 1)
+    )).all()
+    if len(rows) > config.TIMELINE_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"More than {config.TIMELINE_MAX_POINTS} points, use a larger bucket or narrow since/until"
+        )
+
+    points = []
+    for start, yes_count, no_count in rows:
+        yes_total += yes_count
+        no_total += no_count
+        points.append(TimelinePoint(
+            start=start,
+            yes_count=yes_count,
+            no_count=no_count,
+            total=yes_count + no_count,
+            yes_total=yes_total,
+            no_total=no_total,
+        ))
+    return ReferendumTimeline(referendum_id=referendum_id, bucket=bucket, points=points)
+
+async def ensure_streamable(db: AsyncSession, referendum_id: int):
+    if not await db.scalar(select(ReferendumModel.id).where(ReferendumModel.id == referendum_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Referendum with ID {referendum_id} not found"
+        )
+    if results_hub.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live result streams, try again later",
+            headers={"Retry-After": "5"},
+        )
+
+@router.get("/{referendum_id}/results/stream")
+async def stream_referendum_results(
+    referendum_id: int,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Server-Sent Events stream of the referendum's tallies.
+
+    The current counts are sent right away, then an ``results`` event
+    (absolute counts plus the delta since the previous event) whenever votes
+    are committed, at most RESULTS_STREAM_MAX_RATE times per second.
+    """
+    await ensure_streamable(db, referendum_id)
+    await db.close()
+
+    async def events():
+        try:
+            subscription = await results_hub.subscribe(referendum_id)
+        except HubFullError:
+            return
+        except Exception as e:
+            # The client reconnects after the retry delay
+            logger.warning(f"Could not load the results of referendum {referendum_id}: {e}")
+            return
+        try:
+            yield b"retry: 3000\n\n"
+            async for update in subscription:
+                yield update.sse if update is not None else b": keep-alive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/{referendum_id}/results/ws")
+async def websocket_referendum_results(
+    websocket: WebSocket,
+    referendum_id: int,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Same updates as the SSE stream, as JSON text frames."""
+    try:
+        await ensure_streamable(db, referendum_id)
+    except HTTPException as e:
+        await websocket.close(code=1008 if e.status_code == 404 else 1013, reason=e.detail)
+        return
+    await db.close()
+    await websocket.accept()
+    try:
+        subscription = await results_hub.subscribe(referendum_id)
+    except HubFullError:
+        await websocket.close(code=1013)
+        return
+    except Exception as e:
+        logger.warning(f"Could not load the results of referendum {referendum_id}: {e}")
+        await websocket.close(code=1011)
+        return
+
+    async def pump():
+        async for update in subscription:
+            if update is not None:
+                await websocket.send_text(update.json.decode())
+        # The hub closed the stream: the server is shutting down
+        await websocket.close(code=1001)
+
+    async def drain():
+        # Returns once the client disconnects
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
+@router.delete("/", response_model=DeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_referendum(
+    response: Response,
     referendum_id: int = Query(..., description="ID of the referendum"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     ):
+    """Starts deleting the referendum with its votes, tallies, results and
+    tag links in the background and returns the job (``Location: /jobs/{id}``).
+
+    The referendum is marked "deleting" right away and takes no more votes.
+    """
+    referendum = await db.scalar(select(ReferendumModel).where(ReferendumModel.id == referendum_id))
+    if not referendum:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Referendum with ID {referendum_id} not found"
+        )
     try:
-        referendum  = db.query(ReferendumModel).filter(ReferendumModel.id == referendum_id).first()
-        if not referendum:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Referendum with ID {referendum_id} not found"
-            )
-        db.delete(referendum )
-        db.commit()
-        return referendum 
+        # Asking again returns the job already under way
+        job = await deletion_jobs.active_job(db, "referendum", referendum_id)
+        if job is None:
+            total = await count_votes(db, "referendum", referendum_id)
+            referendum.status = "deleting"
+            job = await deletion_jobs.create(db, "referendum", referendum_id, total)
+            await db.commit()
+            referendum_scheduler.forget(referendum_id)
+            await response_cache.invalidate("referendums")
+            deletion_jobs.run(job.id)
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return job
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -85,24 +598,43 @@ async def delete_referendum(
 async def update_referendum(
     referendum_id: int = Query(...),
     update_data: ReferendumUpdate = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        referendum = db.query(ReferendumModel).filter(ReferendumModel.id == referendum_id).first()
+        referendum = await db.scalar(select(ReferendumModel).where(ReferendumModel.id == referendum_id))
         if not referendum:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Referendum with ID {referendum_id} not found"
             )
 
+        if referendum.status == "deleting":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The referendum is being deleted"
+            )
         update_dict = update_data.dict(exclude_unset=True)
+        new_status = update_dict.get("status", referendum.status)
+        if referendum.status == "closed" and new_status != "closed":
+            # Its results are frozen
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A closed referendum cannot be reopened"
+            )
         for field, value in update_dict.items():
             setattr(referendum, field, value)
-        db.commit()
+        if new_status == "closed":
+            await freeze_results(db, referendum_id)
+        await db.commit()
+        await response_cache.invalidate("referendums", "results", f"results:{referendum_id}")
+        referendum_scheduler.track(referendum.id, referendum.status, referendum.start_date, referendum.end_date)
         return referendum
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -1,28 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional
 
-from database.database import get_db
+from database.database import get_async_db, get_read_db, bump_index_version
 from database.database import Tag, Referendum, ReferendumTag
+from database.tag_index import tag_index
+from routers.referendum import (
+    REFERENDUM_FIELDS, expand_referendums, parse_expand, parse_id_list, referendum_list_namespaces,
+)
+from schemas.referendum import Referendum as ReferendumResponse
 from schemas.tags import (
     TagCreate,
     TagResponse,
+    TagWithCount,
     ReferendumTagCreate,
     ReferendumTagsResponse
 )
+from utils.pagination import PageParams, paginate, paginate_ids, parse_fields, page_response, set_next_cursor
+from utils.response_cache import response_cache
 
 router = APIRouter(
     prefix="/tags",
     tags=["tags"]
 )
 
+TAG_FIELDS = {
+    "id": Tag.id,
+    "name": Tag.name,
+}
+
+response_cache.cache_route("/tags/", lambda path_params, query: ["tags"])
+response_cache.cache_route("/tags/referendums", lambda path_params, query: ["tags"])
+response_cache.cache_route("/tags/referendum/{referendum_id}", lambda path_params, query: ["tags", "referendums"])
+response_cache.cache_route("/tags/{tag_id}/referendums", referendum_list_namespaces)
+
 # Endpoint do pobierania wszystkich tagów
-@router.get("/", response_model=List[TagResponse])
+@router.get("/", response_model=List[TagWithCount], response_model_exclude_none=True)
 async def get_all_tags(
-    db: Session = Depends(get_db)
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,name"),
+    with_counts: bool = Query(False, description="Add the number of referendums of every tag"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
+    selected_fields = parse_fields(fields, TAG_FIELDS)
     try:
-        tags = db.query(Tag).all()
+        tags, next_cursor = await paginate(
+            db, select(Tag), Tag.id, page, selected_fields, TAG_FIELDS
+        )
+        if with_counts:
+            # Counted from the tag index, not with a GROUP BY over referendum_tags
+            await tag_index.ensure_loaded()
+            if selected_fields:
+                tags = [(*row, tag_index.count(row.id)) for row in tags]
+                selected_fields = selected_fields + ["referendum_count"]
+            else:
+                tags = [
+                    TagWithCount(id=tag.id, name=tag.name, referendum_count=tag_index.count(tag.id))
+                    for tag in tags
+                ]
+        if selected_fields:
+            return page_response(tags, selected_fields, next_cursor)
+        set_next_cursor(response, next_cursor)
         return tags
     except Exception as e:
         raise HTTPException(
@@ -34,10 +75,10 @@ async def get_all_tags(
 @router.post("/", response_model=TagResponse, status_code=status.HTTP_201_CREATED)
 async def create_tag(
     tag_data: TagCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Sprawdź czy tag już istnieje
-    existing_tag = db.query(Tag).filter(Tag.name == tag_data.name).first()
+    existing_tag = await db.scalar(select(Tag).where(Tag.name == tag_data.name))
     if existing_tag:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -47,11 +88,12 @@ async def create_tag(
     try:
         new_tag = Tag(name=tag_data.name)
         db.add(new_tag)
-        db.commit()
-        db.refresh(new_tag)
+        await db.commit()
+        await response_cache.invalidate("tags")
+        await db.refresh(new_tag)
         return new_tag
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating tag: {str(e)}"
@@ -61,10 +103,10 @@ async def create_tag(
 @router.delete("/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_tag(
     tag_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Sprawdź czy tag istnieje
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+    tag = await db.scalar(select(Tag).where(Tag.id == tag_id))
     if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -72,7 +114,7 @@ async def delete_tag(
         )
 
     # Sprawdź czy tag jest używany w jakichś referendum
-    tag_in_use = db.query(ReferendumTag).filter(ReferendumTag.tag_id == tag_id).first()
+    tag_in_use = await db.scalar(select(ReferendumTag).where(ReferendumTag.tag_id == tag_id))
     if tag_in_use:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,62 +122,130 @@ async def delete_tag(
         )
 
     try:
-        db.delete(tag)
-        db.commit()
+        await db.delete(tag)
+        await db.commit()
+        tag_index.drop_tag(tag_id)
+        await response_cache.invalidate("tags")
         return
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting tag: {str(e)}"
         )
 
+# Endpoint do pobierania referendów z danym tagiem
+@router.get("/{tag_id}/referendums", response_model=List[ReferendumResponse])
+async def get_tag_referendums(
+    tag_id: int,
+    response: Response,
+    expand: Optional[str] = Query(None, description="Comma separated relationships to embed: creator, tags, results"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Only referendums with this status"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,title,status"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Referendums tagged with ``tag_id``, in id order, paged from the tag index."""
+    selected_fields = parse_fields(fields, REFERENDUM_FIELDS)
+    expansions = parse_expand(expand)
+    if not await db.scalar(select(Tag.id).where(Tag.id == tag_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tag not found"
+        )
+    try:
+        await tag_index.ensure_loaded()
+        query = select(Referendum)
+        if "creator" in expansions and not selected_fields:
+            query = query.options(joinedload(Referendum.creator))
+        if "tags" in expansions and not selected_fields:
+            query = query.options(selectinload(Referendum.attached_tags))
+        if status_filter:
+            query = query.where(Referendum.status == status_filter)
+        referendums, next_cursor = await paginate_ids(
+            db, query, Referendum.id, page,
+            lambda after, count: tag_index.page([tag_id], True, after, count),
+            selected_fields, REFERENDUM_FIELDS,
+        )
+        if selected_fields:
+            return page_response(referendums, selected_fields, next_cursor)
+        set_next_cursor(response, next_cursor)
+        if expansions & {"tags", "results"}:
+            return await expand_referendums(db, referendums, expansions)
+        return referendums
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching referendums of tag: {str(e)}"
+        )
+
 # Endpoint do pobierania tagów dla konkretnego referendum
 @router.get("/referendum/{referendum_id}", response_model=ReferendumTagsResponse)
 async def get_referendum_tags(
     referendum_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    referendum = db.query(Referendum).filter(Referendum.id == referendum_id).first()
+    referendum = await db.scalar(select(Referendum).where(Referendum.id == referendum_id))
     if not referendum:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Referendum not found"
         )
 
-    tags = db.query(Tag).join(ReferendumTag).filter(
+    tags = (await db.scalars(select(Tag).join(ReferendumTag).where(
         ReferendumTag.referendum_id == referendum_id
-    ).all()
+    ))).all()
 
     return {
         "referendum_id": referendum_id,
         "tags": tags
     }
 
+# Endpoint do pobierania tagów wielu referendów naraz (jedno zapytanie)
+@router.get("/referendums", response_model=List[ReferendumTagsResponse])
+async def get_referendums_tags(
+    ids: str = Query(..., description="Comma separated referendum IDs, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    referendum_ids = list(dict.fromkeys(parse_id_list(ids)))
+    if not referendum_ids:
+        return []
+
+    # Links from the tag index, names in one query for the distinct tags
+    await tag_index.ensure_loaded()
+    tag_ids_by_referendum = {referendum_id: tag_index.tags_of(referendum_id) for referendum_id in referendum_ids}
+    tag_ids = {tag_id for ids in tag_ids_by_referendum.values() for tag_id in ids}
+    tags = {tag.id: tag for tag in await db.scalars(select(Tag).where(Tag.id.in_(tag_ids)))} if tag_ids else {}
+
+    return [
+        {"referendum_id": referendum_id, "tags": [tags[tag_id] for tag_id in ids if tag_id in tags]}
+        for referendum_id, ids in tag_ids_by_referendum.items()
+    ]
+
 # Endpoint do dodawania tagu do referendum
 @router.post("/referendum/", response_model=TagResponse, status_code=status.HTTP_201_CREATED)
 async def add_tag_to_referendum(
     tag_data: ReferendumTagCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    referendum = db.query(Referendum).filter(Referendum.id == tag_data.referendum_id).first()
+    referendum = await db.scalar(select(Referendum).where(Referendum.id == tag_data.referendum_id))
     if not referendum:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Referendum not found"
         )
 
-    tag = db.query(Tag).filter(Tag.id == tag_data.tag_id).first()
+    tag = await db.scalar(select(Tag).where(Tag.id == tag_data.tag_id))
     if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tag not found"
         )
 
-    existing_link = db.query(ReferendumTag).filter(
+    existing_link = await db.scalar(select(ReferendumTag).where(
         ReferendumTag.referendum_id == tag_data.referendum_id,
         ReferendumTag.tag_id == tag_data.tag_id
-    ).first()
+    ))
 
     if existing_link:
         raise HTTPException(
@@ -150,11 +260,14 @@ async def add_tag_to_referendum(
         )
         
         db.add(new_link)
-        db.commit()
+        version = await bump_index_version(db, "tags")
+        await db.commit()
+        tag_index.add(tag_data.referendum_id, tag_data.tag_id, version)
+        await response_cache.invalidate("tags")
         return tag
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error adding tag to referendum: {str(e)}"
@@ -164,23 +277,26 @@ async def add_tag_to_referendum(
 async def remove_tag_from_referendum(
     referendum_id: int = Query(..., description="ID of the referendum"),
     tag_id: int = Query(..., description="ID of the tag to remove"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    link = db.query(ReferendumTag).filter(
+    link = await db.scalar(select(ReferendumTag).where(
         ReferendumTag.referendum_id == referendum_id,
         ReferendumTag.tag_id == tag_id
-    ).first()
+    ))
     if not link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tag is not assigned to this referendum"
         )
     try:
-        db.delete(link)
-        db.commit()
+        await db.delete(link)
+        version = await bump_index_version(db, "tags")
+        await db.commit()
+        tag_index.remove(referendum_id, tag_id, version)
+        await response_cache.invalidate("tags")
         return
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error removing tag from referendum: {str(e)}"
@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, Query, Body, HTTPException, status
+from fastapi import APIRouter, Depends, Query, Body, HTTPException, Response, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Annotated
 from pydantic import EmailStr
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+import time
 
-from schemas.user import UserCreate, UserResponse, UserUpdateResponse, UserUpdate
-from database.database import get_db, User as UserModel
+import config
+from schemas.jobs import DeletionJobResponse
+from schemas.user import UserCreate, UserResponse, UserUpdateResponse, UserUpdate, TokenData
+from database.database import get_async_db, get_read_db, User as UserModel
+from database.deletions import count_votes, deletion_jobs
+from utils.cache import TTLCache
+from utils.pagination import PageParams, paginate, parse_fields, page_response, set_next_cursor
+from utils.passwords import password_hasher
+from utils.rate_limit import rate_limiter
+from utils.response_cache import response_cache
 
 
 SECRET_KEY = "your-secret-key-here"
@@ -17,22 +25,34 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 security = HTTPBasic()
 
+# user_id -> time of revocation; tokens issued up to that moment are rejected.
+# Entries only need to outlive the tokens they revoke.
+revoked_users = TTLCache(config.REVOCATION_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def revoke_user_tokens(user_id: int):
+    revoked_users.set(user_id, time.time())
+
 router = APIRouter(prefix="/users", tags=["users"])
 
-pwd_context = CryptContext(
-    schemes=["bcrypt", "plaintext"],
-    deprecated="auto",
-    bcrypt__rounds=12
-)
+# Both hash or verify a password with bcrypt
+rate_limiter.route_cost("POST", "/users/", config.RATE_LIMIT_HASH_COST)
+rate_limiter.route_cost("POST", "/users/token", config.RATE_LIMIT_HASH_COST)
+
+USER_FIELDS = {
+    "id": UserModel.id,
+    "username": UserModel.username,
+    "email": UserModel.email,
+    "role": UserModel.role,
+}
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user: UserCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    existing_user = db.query(UserModel).filter(
+    existing_user = await db.scalar(select(UserModel).where(
         UserModel.username == user.username
-    ).first()
+    ))
     
     if existing_user:
         raise HTTPException(
@@ -40,9 +60,9 @@ async def create_user(
             detail="Username already registered"
         )
 
+    hashed_password = await password_hasher.hash(user.password)
+
     try:
-        hashed_password = pwd_context.hash(user.password)
-        
         new_user = UserModel(
             username=user.username,
             hashed_password=hashed_password,
@@ -51,12 +71,12 @@ async def create_user(
         )
         
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         return new_user
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
@@ -64,15 +84,19 @@ async def create_user(
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
+    response: Response,
     user_id: Optional[int] = Query(None, description="ID of the user"),
     email: Optional[EmailStr] = Query(None, description="Email of the user"),
     role: Optional[str] = Query(None, description="Role of the user"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,username"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
+    selected_fields = parse_fields(fields, USER_FIELDS)
     try:
-        query = db.query(UserModel)
+        query = select(UserModel)
         if user_id:
-            user = query.filter(UserModel.id == user_id).first()
+            user = await db.scalar(query.where(UserModel.id == user_id))
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -80,7 +104,7 @@ async def get_users(
                 )
             return [user]
         if email:
-            user = query.filter(UserModel.email == email).first()
+            user = await db.scalar(query.where(UserModel.email == email))
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -88,9 +112,16 @@ async def get_users(
                 )
             return [user]  
         if role:
-            users = query.filter(UserModel.role == role).all()
-            return users   
-        return query.all()
+            query = query.where(UserModel.role == role)
+        users, next_cursor = await paginate(
+            db, query, UserModel.id, page, selected_fields, USER_FIELDS
+        )
+        if selected_fields:
+            return page_response(users, selected_fields, next_cursor)
+        set_next_cursor(response, next_cursor)
+        return users
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -101,10 +132,10 @@ async def get_users(
 async def update_user(
     user_id: int = Query(...),
     user_update: UserUpdate = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        user = db.query(UserModel).filter(UserModel.id == user_id).first()
+        user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -113,88 +144,149 @@ async def update_user(
         user_dict = user_update.dict(exclude_unset=True)
         for field, value in user_dict.items():
             setattr(user, field, value)
+        if "role" in user_dict or "password" in user_dict:
+            revoke_user_tokens(user.id)
         # if user_dict.get("password"):
-        #     user.hashed_password = pwd_context.hash(user_dict["password"])
+        #     user.hashed_password = await password_hasher.hash(user_dict["password"])
         #     setattr(user, "hashed_password", user.hashed_password)
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate("users")
         return user
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
         
-@router.delete("/", response_model=UserUpdateResponse)
+@router.delete("/", response_model=DeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_user(
+    response: Response,
     user_id: int = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """Starts deleting the user and their votes in the background and returns
+    the job (``Location: /jobs/{id}``). The votes are taken off the tallies,
+    the user's referendums stay without a creator."""
+    user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found"
+        )
     try:
-        user = db.query(UserModel).filter(UserModel.id == user_id).first()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User with ID {user_id} not found"
-            )
-        db.delete(user)
-        db.commit()
-        return user
+        job = await deletion_jobs.active_job(db, "user", user_id)
+        if job is None:
+            total = await count_votes(db, "user", user_id)
+            job = await deletion_jobs.create(db, "user", user_id, total)
+            await db.commit()
+            deletion_jobs.run(job.id)
+        revoke_user_tokens(user_id)
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return job
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+
+async def on_deletion_progress(job, tallies: dict):
+    if job.status == "done" and job.kind == "user":
+        # Tokens issued while the job ran
+        revoke_user_tokens(job.target_id)
+        await response_cache.invalidate("users")
+
+
+deletion_jobs.add_listener(on_deletion_progress)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": round(time.time(), 3)})
+    # python-jose and its crypto backends load with the first token, not at startup
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=True)
 
-async def get_current_user_id(
+def decode_access_token(token: str) -> Optional[TokenData]:
+    """Validates the signature and expiry and checks the revocation cache."""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+    token_data = TokenData(
+        user_id=user_id,
+        role=payload.get("role"),
+        issued_at=payload.get("iat", 0),
+    )
+    revoked_at = revoked_users.get(user_id)
+    if revoked_at is not None and token_data.issued_at <= revoked_at:
+        return None
+    return token_data
+
+async def get_current_token_data(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
-) -> int:
+    db: AsyncSession = Depends(get_async_db)
+) -> TokenData:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    token_data = decode_access_token(token)
+    if token_data is None:
         raise credentials_exception
-    
-    user = db.query(UserModel).filter(UserModel.id == int(user_id)).first()
+
+    # Tokens issued before role/iat claims existed always go through the lookup
+    if config.AUTH_STATELESS and token_data.role is not None and token_data.issued_at:
+        return token_data
+
+    user = await db.scalar(select(UserModel).where(UserModel.id == token_data.user_id))
+    # Hand the connection back to the pool: the route may need one of its own
+    # (e.g. the vote writer) while this request is still in flight
+    await db.commit()
     if user is None:
         raise credentials_exception
-        
-    return int(user_id)
+    token_data.role = user.role
+    return token_data
+
+async def get_current_user_id(
+    token_data: TokenData = Depends(get_current_token_data)
+) -> int:
+    return token_data.user_id
+
+async def require_admin(
+    token_data: TokenData = Depends(get_current_token_data)
+) -> TokenData:
+    if token_data.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin role required"
+        )
+    return token_data
 
 
 @router.post("/token")
 async def login_for_token(
     credentials: HTTPBasicCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(UserModel).filter(
+    user = await db.scalar(select(UserModel).where(
         UserModel.username == credentials.username
-    ).first()
+    ))
 
-    if not user or not pwd_context.verify(credentials.password, user.hashed_password):
+    if not user or not await password_hasher.verify(credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -203,7 +295,7 @@ async def login_for_token(
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)},
+        data={"sub": str(user.id), "role": user.role},
         expires_delta=access_token_expires
     )
     
@@ -211,23 +303,16 @@ async def login_for_token(
 
 @router.get("/me", response_model=UserResponse)
 async def read_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials"
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+
+    user = await db.scalar(select(UserModel).where(UserModel.id == current_user_id))
     if user is None:
         raise credentials_exception
         
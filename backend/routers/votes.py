@@ -1,46 +1,91 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from loguru import logger
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+from datetime import datetime
 
 from schemas.votes import VoteCreate, Vote
-from database.database import get_db, Vote as VoteModel
+import config
+from database.database import get_read_db, Vote as VoteModel
+from database.deletions import deletion_jobs
+from database.scheduler import referendum_scheduler, ReferendumNotFoundError, VotingClosedError
+from database.vote_writer import vote_writer, DuplicateVoteError, VoteQueueFullError, VoteTargetMissingError
+from routers.referendum import parse_id_list
 from routers.user import get_current_user_id
+from utils.pagination import PageParams, paginate, parse_fields, page_response, set_next_cursor
+from utils.response_cache import response_cache
 
 
 router = APIRouter(prefix="/votes", tags=["votes"])
 
+# One record per vote is too much for production logs, only a sample is kept
+vote_log = logger.bind(sample=config.LOG_VOTE_SAMPLE_RATE)
+
+VOTE_FIELDS = {
+    "id": VoteModel.id,
+    "user_id": VoteModel.user_id,
+    "referendum_id": VoteModel.referendum_id,
+    "vote_value": VoteModel.vote_value,
+    "voted_at": VoteModel.voted_at,
+}
+
+# Full rows in the key order of the Vote schema, for the fast list responses
+VOTE_ROW = list(Vote.model_fields)
+vote_list_adapter = TypeAdapter(List[Vote])
+
+
+async def invalidate_results(tallies: dict):
+    await response_cache.invalidate("results", *[f"results:{referendum_id}" for referendum_id in tallies])
+
+
+vote_writer.add_listener(invalidate_results)
+
+
+async def invalidate_deleted_votes(job, tallies: dict):
+    if tallies:
+        await invalidate_results(tallies)
+
+
+deletion_jobs.add_listener(invalidate_deleted_votes)
+
 
 @router.post("/", response_model=Vote, status_code=status.HTTP_201_CREATED)
 async def create_vote(
     vote: VoteCreate,
     current_user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
 ):
-    existing_vote = db.query(VoteModel).filter(
-        VoteModel.user_id == current_user_id,
-        VoteModel.referendum_id == vote.referendum_id
-    ).first()
-    
-    if existing_vote:
+    try:
+        await referendum_scheduler.ensure_open(vote.referendum_id)
+        if config.VOTE_INGEST_MODE == "batched":
+            new_vote = await vote_writer.submit(current_user_id, vote.referendum_id, vote.vote_value)
+        else:
+            new_vote = await vote_writer.write(current_user_id, vote.referendum_id, vote.vote_value)
+        vote_log.info("User {} voted on referendum {}", current_user_id, vote.referendum_id)
+        return new_vote
+    except (ReferendumNotFoundError, VoteTargetMissingError):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Referendum with ID {vote.referendum_id} not found"
+        )
+    except VotingClosedError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This referendum is not open for voting"
+        )
+    except DuplicateVoteError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You have already voted on this referendum"
         )
-
-    try:
-        new_vote = VoteModel(
-            user_id=current_user_id,
-            referendum_id=vote.referendum_id,
-            vote_value=vote.vote_value,
+    except VoteQueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many votes are waiting to be saved, try again shortly",
+            headers={"Retry-After": "1"},
         )
-        
-        db.add(new_vote)
-        db.commit()
-        db.refresh(new_vote)
-        return new_vote
-        
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating vote: {str(e)}"
@@ -48,15 +93,23 @@ async def create_vote(
         
 @router.get("/", response_model=List[Vote])
 async def get_votes(
+    response: Response,
     vote_id: Optional[int] = Query(None, description="ID of the vote"),
     referendum_id: Optional[int] = Query(None, description="ID of the referendum"),
+    referendum_ids: Optional[str] = Query(None, description="Comma separated referendum IDs, e.g. 1,2,3"),
     user_id: Optional[int] = Query(None, description="ID of the user"),
-    db: Session = Depends(get_db)
+    voted_from: Optional[datetime] = Query(None, description="Only votes cast on or after this date"),
+    voted_to: Optional[datetime] = Query(None, description="Only votes cast on or before this date"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,vote_value"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
 ):
+    selected_fields = parse_fields(fields, VOTE_FIELDS)
+    fast = config.FAST_LIST_RESPONSES and not selected_fields
     try:
-        query = db.query(VoteModel)
+        query = select(VoteModel)
         if vote_id:
-            vote = query.filter(VoteModel.id == vote_id).first()
+            vote = await db.scalar(query.where(VoteModel.id == vote_id))
             if not vote:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -64,19 +117,36 @@ async def get_votes(
                 )
             return [vote]
         if referendum_id:
-            vote = query.filter(VoteModel.referendum_id == referendum_id).all()
-            if not vote:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Vote not found"
-                )
-            return vote
+            query = query.where(VoteModel.referendum_id == referendum_id)
+        if referendum_ids:
+            # One request for "my votes" on a whole page of referendums
+            query = query.where(VoteModel.referendum_id.in_(parse_id_list(referendum_ids)))
         if user_id:
-            vote = query.filter(VoteModel.user_id == user_id).all()
-            return vote   
-        return query.all()
+            query = query.where(VoteModel.user_id == user_id)
+        if voted_from:
+            query = query.where(VoteModel.voted_at >= voted_from)
+        if voted_to:
+            query = query.where(VoteModel.voted_at <= voted_to)
+        votes, next_cursor = await paginate(
+            db, query, VoteModel.id, page, VOTE_ROW if fast else selected_fields, VOTE_FIELDS
+        )
+        # A user who has not voted on the referendum simply gets no votes
+        if referendum_id and not user_id and not votes and page.after is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vote not found"
+            )
+        if fast:
+            adapter = vote_list_adapter if config.FAST_LIST_VALIDATION else None
+            return page_response(votes, VOTE_ROW, next_cursor, adapter)
+        if selected_fields:
+            return page_response(votes, selected_fields, next_cursor)
+        set_next_cursor(response, next_cursor)
+        return votes
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,22 @@
+from typing import List
+from pydantic import BaseModel
+
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportSummary(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    # Only the first MAX_REPORTED_ERRORS rejected rows are listed
+    errors: List[ImportRowError] = []
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(ImportRowError(line=line, error=error))
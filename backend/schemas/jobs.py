@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class DeletionJobResponse(BaseModel):
+    id: int
+    kind: str  # referendum/user
+    target_id: int
+    status: str  # pending/running/done/failed
+    total: int  # votes to delete when the job was created
+    deleted: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,20 +1,61 @@
-from datetime import datetime
-from typing import Optional, Literal
-from pydantic import BaseModel
+from datetime import datetime, timezone
+from typing import Annotated, List, Optional, Literal
+from pydantic import AfterValidator, BaseModel
 
+from schemas.tags import TagResponse
 from schemas.user import UserResponse
 
 
+def naive_utc(value: datetime) -> datetime:
+    """Dates are stored as naive UTC; an offset is applied, not dropped."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Referendum dates sent by clients
+UTCDateTime = Annotated[datetime, AfterValidator(naive_utc)]
+
+
+class ReferendumResults(BaseModel):
+    referendum_id: int
+    yes_count: int = 0
+    no_count: int = 0
+    total: int = 0
+
+class TimelinePoint(BaseModel):
+    start: datetime
+    yes_count: int = 0
+    no_count: int = 0
+    total: int = 0
+    # Running totals up to the end of this bucket, for trend curves
+    yes_total: int = 0
+    no_total: int = 0
+
+class ReferendumTimeline(BaseModel):
+    referendum_id: int
+    bucket: Literal["minute", "hour", "day"]
+    points: List[TimelinePoint] = []  # buckets without votes are left out
+
 class CreateReferendum(BaseModel):
     title:str
     description: str
 
+class ReferendumImport(CreateReferendum):
+    id: Optional[int] = None  # kept when given, rows whose id already exists are skipped
+    status: Literal["pending", "active", "closed", "cancelled"] = "pending"
+    start_date: Optional[UTCDateTime] = None
+    end_date: Optional[UTCDateTime] = None
+    creator_id: Optional[int] = None
+
 class Referendum(CreateReferendum):
     id: int
     status: str = "pending" # e.g., "active", "closed", "cancelled" 
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     creator: Optional[UserResponse] = None
+    # Only filled in with expand=tags / expand=results
+    tags: Optional[List[TagResponse]] = None
+    results: Optional[ReferendumResults] = None
     
     class Config:
         from_attributes = True
@@ -23,8 +64,8 @@ class ReferendumUpdate(BaseModel):
     status: Optional[Literal["pending", "active", "closed", "cancelled"]] = None
     title: Optional[str] = None
     description: Optional[str] = None
-    start_date: Optional[datetime] = None
-    end_date: Optional[datetime] = None
+    start_date: Optional[UTCDateTime] = None
+    end_date: Optional[UTCDateTime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
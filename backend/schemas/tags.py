@@ -13,6 +13,9 @@ class TagResponse(TagBase):
     class Config:
         from_attributes = True
 
+class TagWithCount(TagResponse):
+    referendum_count: Optional[int] = None  # only with with_counts=true
+
 class ReferendumTagBase(BaseModel):
     referendum_id: int
     tag_id: int
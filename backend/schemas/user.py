@@ -27,4 +27,9 @@ class UserUpdateResponse(UserResponse):
     hashed_password: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TokenData(BaseModel):
+    user_id: int
+    role: Optional[str] = None
+    issued_at: float = 0
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -6,6 +7,10 @@ class VoteCreate(BaseModel):
     referendum_id: int
     vote_value: bool 
 
+class VoteImport(VoteCreate):
+    user_id: int
+    voted_at: Optional[datetime] = None  # time of the import when missing
+
 class Vote(VoteCreate):
     id: int
     user_id: int
@@ -0,0 +1,190 @@
+"""Production entry point: one uvicorn worker per core on a shared socket.
+
+    cd backend && python serve.py --workers 4 --port 8000
+
+The parent process runs the migrations once, imports the app (workers are
+forked from the warmed-up parent unless --no-preload is given) and binds the
+listening socket, then supervises the workers and restarts crashed ones.
+SIGTERM or SIGINT stops the workers gracefully: they stop accepting
+connections, let in-flight requests finish and run the lifespan shutdown,
+which flushes the queued vote batches, for up to --graceful-timeout seconds.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+from loguru import logger
+
+import config
+from database import database
+from logger import configure_logger
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_WORKERS, help="Defaults to the number of cores")
+    parser.add_argument("--backlog", type=int, default=config.WEB_BACKLOG, help="Pending connections queue of the socket")
+    parser.add_argument("--keep-alive", type=int, default=config.WEB_KEEP_ALIVE, help="Seconds an idle connection is kept")
+    parser.add_argument("--graceful-timeout", type=int, default=config.WEB_GRACEFUL_TIMEOUT,
+                        help="Seconds a stopping worker may spend on in-flight requests and queued votes")
+    parser.add_argument("--access-log", action="store_true", default=config.WEB_ACCESS_LOG)
+    parser.add_argument("--no-migrate", action="store_true", help="Skip creating tables and running migrations")
+    parser.add_argument("--no-preload", action="store_true", help="Import the app in every worker instead of once")
+    return parser.parse_args()
+
+
+def load_app():
+    from main import app
+    return app
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def watch_parent(parent_pid: int):
+    """Stops the worker when the supervisor is gone, instead of serving on as an orphan."""
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def run_worker(args, sock: socket.socket, app, parent_pid: int):
+    # Connections inherited from the parent must not be shared between processes
+    database.engine.dispose(close=False)
+    database.async_engine.sync_engine.dispose(close=False)
+    if database.read_async_engine is not None:
+        database.read_async_engine.sync_engine.dispose(close=False)
+    # Ctrl+C goes to the supervisor only, which then stops every worker once
+    os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    threading.Thread(target=watch_parent, args=(parent_pid,), name="parent-watch", daemon=True).start()
+
+    server = uvicorn.Server(uvicorn.Config(
+        app if app is not None else load_app(),
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+    ))
+    server.run(sockets=[sock])
+
+
+def fork_worker(args, sock: socket.socket, app) -> int:
+    # The log writer thread does not survive fork(); stop it (flushing its
+    # buffer) so no lock is held mid-write, and start a fresh one on each side
+    logger.remove()
+    parent_pid = os.getpid()
+    pid = os.fork()
+    configure_logger()
+    if pid == 0:
+        try:
+            run_worker(args, sock, app, parent_pid)
+        except BaseException as e:
+            if not isinstance(e, SystemExit):
+                logger.exception(f"Worker {os.getpid()} crashed")
+            logger.remove()
+            os._exit(1)
+        logger.remove()
+        os._exit(0)
+    return pid
+
+
+def supervise(args, sock: socket.socket, app):
+    workers = {}  # pid -> start time
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, stopping {len(workers)} workers...")
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for _ in range(args.workers):
+        pid = fork_worker(args, sock, app)
+        workers[pid] = time.monotonic()
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers: {sorted(workers)}")
+
+    while not stopping:
+        time.sleep(0.5)
+        while workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            started = workers.pop(pid, None)
+            if started is None or stopping:
+                continue
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started < 1:
+                # Crashing right at startup, do not spin
+                time.sleep(1)
+            new_pid = fork_worker(args, sock, app)
+            workers[new_pid] = time.monotonic()
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + args.graceful_timeout + 5
+    while workers and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(0.1)
+        else:
+            workers.pop(pid, None)
+    for pid in workers:
+        logger.warning(f"Worker {pid} did not stop in time, killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    logger.info("All workers stopped")
+
+
+def main():
+    args = parse_args()
+    configure_logger()
+    if not args.no_migrate:
+        if database.create_tables():
+            logger.info("Database tables created successfully!")
+        else:
+            logger.info("Database schema is up to date, nothing to create")
+        database.engine.dispose()
+
+    if not hasattr(os, "fork"):
+        # Windows: uvicorn spawns the workers itself, each importing the app
+        logger.warning("fork() is not available, the app is imported by every worker")
+        uvicorn.run(
+            "main:app", host=args.host, port=args.port, workers=args.workers, backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive, timeout_graceful_shutdown=args.graceful_timeout,
+            access_log=args.access_log,
+        )
+        return
+
+    app = None if args.no_preload else load_app()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    try:
+        supervise(args, sock, app)
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
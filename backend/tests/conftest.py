@@ -0,0 +1,30 @@
+"""Points the app at a scratch database before any of its modules is imported.
+
+    cd backend && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.database opens its engines on import; never let that be database/referendum.db
+SCRATCH_DIR = tempfile.mkdtemp(prefix="referendum-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'app.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("READ_DATABASE_URL", None)
+# The API tests send more requests than one client's burst, and wait for closes
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["REFERENDUM_CLOSE_GRACE_SECONDS"] = "0.2"
+
+import pytest
+from sqlalchemy import create_engine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """An empty SQLite database of its own."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    engine.dispose()
@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.explain_indexes import HOT_QUERIES, check, explain, plan_problems
+from database.database import Base
+from database.migrations import run_migrations
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name, stmt, expected_index", HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_an_index(migrated_engine, name, stmt, expected_index):
+    with migrated_engine.connect() as conn:
+        plan = explain(conn, stmt)
+    assert plan_problems(plan, expected_index) == [], plan
+
+
+def test_check_reports_success(migrated_engine, capsys):
+    assert check(migrated_engine)
+    assert "FAIL" not in capsys.readouterr().out
+
+
+def test_missing_index_is_reported():
+    assert plan_problems(["SCAN votes"], "ix_votes_referendum_id") == ["SCAN votes", "ix_votes_referendum_id not used"]
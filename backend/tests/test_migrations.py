@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, inspect, select
+
+from database.database import Base, Referendum, ReferendumTally, User, Vote
+from database.migrations import MIGRATIONS, applied_versions, run_migrations, schema_is_current, schema_migrations
+
+ALL_VERSIONS = sorted(step.version for step in MIGRATIONS)
+
+
+def create_schema(engine):
+    Base.metadata.create_all(bind=engine)
+    return run_migrations(engine)
+
+
+def add_votes(engine, votes):
+    """One user and one referendum, then ``(user_id, vote_value)`` votes on it."""
+    with engine.begin() as conn:
+        for user_id in {user_id for user_id, _ in votes}:
+            conn.execute(User.__table__.insert().values(
+                id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+                hashed_password="x", role="user",
+            ))
+        conn.execute(Referendum.__table__.insert().values(id=1, title="Budget", description="d", status="active"))
+        conn.execute(Vote.__table__.insert(), [
+            {"user_id": user_id, "referendum_id": 1, "vote_value": value, "voted_at": datetime(2026, 1, 1)}
+            for user_id, value in votes
+        ])
+
+
+def test_fresh_database_applies_every_migration(engine):
+    assert create_schema(engine) == ALL_VERSIONS
+    assert applied_versions(engine) == ALL_VERSIONS
+    assert schema_is_current(engine)
+
+
+def test_second_run_applies_nothing(engine):
+    create_schema(engine)
+    assert run_migrations(engine) == []
+    assert schema_is_current(engine)
+
+
+def test_migrations_are_harmless_on_a_current_schema(engine):
+    create_schema(engine)
+    add_votes(engine, [(1, True), (2, False), (3, True)])
+    with engine.begin() as conn:
+        conn.execute(delete(schema_migrations))
+    assert not schema_is_current(engine)
+
+    assert run_migrations(engine) == ALL_VERSIONS
+    assert run_migrations(engine) == []
+    with engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(Vote)) == 3
+        tally = conn.execute(select(ReferendumTally.yes_count, ReferendumTally.no_count)).one()
+    assert tuple(tally) == (2, 1)
+
+
+def test_old_database_is_deduplicated_and_indexed(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_votes_user_referendum")
+    add_votes(engine, [(1, True), (1, False), (2, False)])
+
+    assert run_migrations(engine) == ALL_VERSIONS
+    with engine.connect() as conn:
+        votes = conn.execute(select(Vote.user_id, Vote.vote_value).order_by(Vote.id)).all()
+    # The earliest vote of each user is kept
+    assert [tuple(vote) for vote in votes] == [(1, True), (2, False)]
+    assert "ix_votes_user_referendum" in {index["name"] for index in inspect(engine).get_indexes("votes")}
+    assert run_migrations(engine) == []
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import database
+from database.database import Referendum, ReferendumResult, ReferendumTally
+from database.scheduler import ReferendumScheduler, VotingWindow
+
+CEST = timezone(timedelta(hours=2))
+
+
+@pytest.fixture(scope="module")
+def client():
+    database.create_tables()
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def voters(client):
+    """Authorization headers of three users."""
+    headers = []
+    for n in range(3):
+        username = f"voter{n}"
+        client.post("/users/", json={"username": username, "email": f"{username}@example.com", "password": "x"})
+        token = client.post("/users/token", auth=(username, "x")).json()["access_token"]
+        headers.append({"Authorization": f"Bearer {token}"})
+    return headers
+
+
+def create_referendum(client, headers, **changes) -> int:
+    referendum_id = client.post("/referendums/", json={"title": "Budget", "description": "d"}, headers=headers).json()["id"]
+    if changes:
+        response = client.patch("/referendums/", params={"referendum_id": referendum_id}, json=changes)
+        assert response.status_code == 200, response.json()
+    return referendum_id
+
+
+def vote(client, headers, referendum_id: int, value: bool) -> int:
+    return client.post("/votes/", json={"referendum_id": referendum_id, "vote_value": value}, headers=headers).status_code
+
+
+def status_of(client, referendum_id: int) -> str:
+    return client.get("/referendums/", params={"referendum_id": referendum_id}).json()[0]["status"]
+
+
+def wait_for_status(client, referendum_id: int, expected: str, timeout: float = 5) -> str:
+    deadline = time.monotonic() + timeout
+    while (current := status_of(client, referendum_id)) != expected and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return current
+
+
+def stored(model, referendum_id: int):
+    with database.SessionLocal() as db:
+        return db.get(model, referendum_id)
+
+
+def test_end_date_with_offset_closes_on_time(client, voters):
+    now = datetime.now(CEST)
+    end_date = now + timedelta(seconds=1.5)
+    referendum_id = create_referendum(
+        client, voters[0], status="active",
+        start_date=(now - timedelta(minutes=1)).isoformat(), end_date=end_date.isoformat(),
+    )
+    # Stored as naive UTC, the same moment the scheduler closes at
+    assert stored(Referendum, referendum_id).end_date == end_date.astimezone(timezone.utc).replace(tzinfo=None)
+    assert vote(client, voters[0], referendum_id, True) == 201
+
+    assert wait_for_status(client, referendum_id, "closed") == "closed"
+    assert datetime.now(CEST) < end_date + timedelta(seconds=3)
+
+
+def test_votes_rejected_after_close(client, voters):
+    now = datetime.now(CEST)
+    referendum_id = create_referendum(
+        client, voters[0], status="active",
+        start_date=(now - timedelta(minutes=1)).isoformat(), end_date=(now + timedelta(seconds=1)).isoformat(),
+    )
+    assert vote(client, voters[0], referendum_id, True) == 201
+    assert wait_for_status(client, referendum_id, "closed") == "closed"
+    assert vote(client, voters[1], referendum_id, False) == 400
+
+    closed_by_hand = create_referendum(client, voters[0], status="active")
+    client.patch("/referendums/", params={"referendum_id": closed_by_hand}, json={"status": "closed"})
+    assert vote(client, voters[0], closed_by_hand, True) == 400
+
+
+def test_pending_referendum_takes_no_votes(client, voters):
+    referendum_id = create_referendum(
+        client, voters[0], start_date=(datetime.now(CEST) - timedelta(minutes=1)).isoformat(),
+    )
+    assert status_of(client, referendum_id) == "pending"
+    assert vote(client, voters[0], referendum_id, True) == 400
+
+
+def test_frozen_result_matches_tally(client, voters):
+    now = datetime.now(CEST)
+    referendum_id = create_referendum(
+        client, voters[0], status="active",
+        start_date=(now - timedelta(minutes=1)).isoformat(), end_date=(now + timedelta(seconds=1.5)).isoformat(),
+    )
+    for headers, value in zip(voters, (True, True, False)):
+        assert vote(client, headers, referendum_id, value) == 201
+    assert wait_for_status(client, referendum_id, "closed") == "closed"
+
+    tally, result = stored(ReferendumTally, referendum_id), stored(ReferendumResult, referendum_id)
+    assert (result.yes_count, result.no_count) == (tally.yes_count, tally.no_count) == (2, 1)
+    assert client.get(f"/referendums/{referendum_id}/results").json() == {
+        "referendum_id": referendum_id, "yes_count": 2, "no_count": 1, "total": 3,
+    }
+
+
+def test_voting_window_only_opens_active_referendums():
+    now = datetime.utcnow()
+    hour = timedelta(hours=1)
+    assert VotingWindow("active", now - hour, now + hour).is_open(now)
+    assert not VotingWindow("active", now - hour, now).is_open(now)
+    for status in ("pending", "closed", "cancelled", "deleting"):
+        assert not VotingWindow(status, now - hour, now + hour).is_open(now)
+
+
+def test_moved_end_date_is_rescheduled(tmp_path):
+    """A close that finds the end date moved later runs again at the new date."""
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'scheduler.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        now = datetime.utcnow()
+        async with sessions() as db:
+            referendum = Referendum(title="t", description="d", status="active",
+                                    start_date=now - timedelta(hours=1), end_date=now + timedelta(seconds=1))
+            db.add(referendum)
+            await db.commit()
+
+        scheduler = ReferendumScheduler(sessions, close_grace=0)
+        await scheduler.start()
+        # Tracked with an end date the row no longer has
+        scheduler.track(referendum.id, "active", None, now + timedelta(seconds=0.2))
+        try:
+            await asyncio.sleep(0.6)
+            async with sessions() as db:
+                early = await db.scalar(select(Referendum.status).where(Referendum.id == referendum.id))
+            await asyncio.sleep(1)
+            async with sessions() as db:
+                late = await db.scalar(select(Referendum.status).where(Referendum.id == referendum.id))
+        finally:
+            await scheduler.stop()
+            await engine.dispose()
+        return early, late
+
+    assert asyncio.run(scenario()) == ("active", "closed")
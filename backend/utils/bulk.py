@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterable, AsyncIterator, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_format(fmt: Optional[str], content_type: Optional[str] = None) -> str:
+    """``format=`` wins; otherwise a CSV content type means CSV and anything else NDJSON."""
+    if fmt is None:
+        return "csv" if content_type and content_type.split(";")[0].strip() == MEDIA_TYPES["csv"] else "ndjson"
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format {fmt}. Allowed: {', '.join(MEDIA_TYPES)}"
+        )
+    return fmt
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Splits a streamed request body into numbered lines, one chunk at a time."""
+    buffer = bytearray()
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, rest = buffer.split(b"\n")
+        buffer = bytearray(rest)
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield number + 1, buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def iter_records(chunks: AsyncIterable[bytes], fmt: str) -> AsyncIterator[Tuple[int, Union[dict, Exception]]]:
+    """Yields ``(line, record)`` from an NDJSON or CSV body (with a header row).
+
+    Rows that cannot be parsed are yielded as the exception instead, so the
+    caller can report them and go on. Empty CSV cells become ``None``.
+    """
+    if fmt == "ndjson":
+        async for number, line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield number, ValueError("Expected a JSON object")
+                continue
+            yield number, record
+        return
+
+    header = None
+    pending = []
+    start = 0
+    async for number, line in iter_lines(chunks):
+        if not pending:
+            if not line.strip():
+                continue
+            start = number
+        pending.append(line)
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            # A quoted field continues on the next line
+            continue
+        pending = []
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield start, ValueError(f"Invalid CSV: {e}")
+            continue
+        if header is None:
+            header = [name.strip().lstrip("\ufeff") for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield start, {name: value if value != "" else None for name, value in zip(header, values)}
+    if pending:
+        yield start, ValueError("Unterminated quoted field")
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_rows(rows: Sequence[Sequence], columns: Sequence[str], fmt: str) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(
+            [_plain(value) for value in row] for row in rows
+        )
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps({column: _plain(value) for column, value in zip(columns, row)}) + "\n"
+        for row in rows
+    ).encode()
+
+
+async def stream_rows(
+    session_factory: async_sessionmaker,
+    query: Select,
+    columns: Sequence[str],
+    fmt: str,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    """Encodes ``query`` chunk by chunk from a server-side cursor.
+
+    Uses its own session, which stays open for as long as the response is
+    being sent, so only ``chunk_size`` rows are held in memory at a time.
+    """
+    if fmt == "csv":
+        yield encode_rows([columns], columns, fmt)
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield encode_rows(rows, columns, fmt)
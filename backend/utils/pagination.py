@@ -0,0 +1,136 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.serialization import encode_items, rows_to_dicts
+
+# Default of the ranked search; the list endpoints return everything without ``limit``
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Most ids sent in one IN (...) by paginate_ids
+MAX_ID_CHUNK = 10000
+
+
+class PageParams:
+    """Keyset pagination parameters shared by the list endpoints.
+
+    Pages are ordered by ``id``; ``after`` is the ``next_cursor`` returned with
+    the previous page (sent back in the ``X-Next-Cursor`` header). Without
+    ``limit`` every row after the cursor is returned and there is no next page.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items to return"),
+        after: Optional[int] = Query(None, ge=0, description="Cursor from the previous page (last seen ID)"),
+    ):
+        self.limit = limit
+        self.after = after
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt: Select,
+    id_column,
+    page: PageParams,
+    fields: Optional[List[str]] = None,
+    columns: Optional[Dict[str, object]] = None,
+) -> Tuple[list, Optional[str]]:
+    """Applies the keyset to ``stmt`` and returns the page with the next cursor.
+
+    With ``fields`` the statement is narrowed to those columns and plain rows
+    are returned instead of ORM objects. One extra row is fetched to tell
+    whether another page exists, so the last page never produces a dangling
+    cursor.
+    """
+    if page.after is not None:
+        stmt = stmt.where(id_column > page.after)
+    if fields:
+        stmt = stmt.with_only_columns(*[columns[name].label(name) for name in fields])
+    stmt = stmt.order_by(id_column)
+    if page.limit is not None:
+        stmt = stmt.limit(page.limit + 1)
+    result = await db.execute(stmt)
+    rows = result.all() if fields else result.scalars().all()
+    if page.limit is None or len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    return rows, str(rows[-1].id)
+
+
+async def paginate_ids(
+    db: AsyncSession,
+    stmt: Select,
+    id_column,
+    page: PageParams,
+    next_ids: Callable[[Optional[int], int], List[int]],
+    fields: Optional[List[str]] = None,
+    columns: Optional[Dict[str, object]] = None,
+) -> Tuple[list, Optional[str]]:
+    """Like ``paginate``, for rows whose ids come from an in-memory index.
+
+    ``next_ids(after, count)`` returns up to ``count`` candidate ids above
+    ``after`` in ascending order. Candidates are fetched by primary key in
+    growing chunks and filtered by ``stmt`` until the page is full, so the
+    usual filters still apply.
+    """
+    if fields:
+        stmt = stmt.with_only_columns(*[columns[name].label(name) for name in fields])
+    rows = []
+    after = page.after
+    chunk = MAX_ID_CHUNK if page.limit is None else page.limit + 1
+    while page.limit is None or len(rows) <= page.limit:
+        ids = next_ids(after, chunk)
+        if not ids:
+            break
+        result = await db.execute(stmt.where(id_column.in_(ids)).order_by(id_column))
+        rows.extend(result.all() if fields else result.scalars().all())
+        if len(ids) < chunk:
+            break
+        after = ids[-1]
+        chunk = min(chunk * 2, MAX_ID_CHUNK)
+    if page.limit is None or len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    return rows, str(rows[-1].id)
+
+
+def parse_fields(fields: Optional[str], columns: Dict[str, object]) -> Optional[List[str]]:
+    """Validates a ``fields=a,b,c`` projection against the selectable columns.
+
+    ``id`` is always included because it is the pagination key.
+    """
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in columns]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(columns)}"
+        )
+    if "id" in requested:
+        requested.remove("id")
+    return ["id"] + requested
+
+
+def page_response(
+    rows: list, fields: List[str], next_cursor: Optional[str], adapter: Optional[TypeAdapter] = None
+) -> Response:
+    """Builds the response for a page of plain rows, bypassing the response model."""
+    return items_response(rows_to_dicts(rows, fields), next_cursor, adapter)
+
+
+def items_response(items: List[dict], next_cursor: Optional[str], adapter: Optional[TypeAdapter] = None) -> Response:
+    response = Response(content=encode_items(items, adapter), media_type="application/json")
+    set_next_cursor(response, next_cursor)
+    return response
+
+
+def set_next_cursor(response, next_cursor: Optional[str]):
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+import config
+from utils.cache import TTLCache
+from utils.metrics import Counter, Gauge, Histogram
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib is imported with the first hash or verification (in the pool
+    # worker that runs it), not at startup
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt", "plaintext"],
+        deprecated="auto",
+        bcrypt__rounds=12
+    )
+
+HASH_BUCKETS = (0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+hash_duration = Histogram(
+    "password_hash_duration_seconds", "Time spent hashing or verifying a password in the pool",
+    ["operation"], buckets=HASH_BUCKETS,
+)
+hash_queue_wait = Histogram(
+    "password_hash_queue_wait_seconds", "Time a hashing job waited for a pool worker",
+    ["operation"], buckets=HASH_BUCKETS,
+)
+hash_pending = Gauge("password_hash_pending", "Hashing jobs queued or running")
+hash_rejected = Counter("password_hash_rejected_total", "Hashing jobs rejected because the queue was full", ["operation"])
+credential_cache_hits = Counter("credential_cache_hits_total", "Password verifications answered from the credential cache")
+
+
+def _run(operation: str, queued_at: float, *args):
+    # Runs inside the pool worker; time.monotonic() is shared across processes
+    started = time.monotonic()
+    if operation == "hash":
+        result = get_pwd_context().hash(*args)
+    else:
+        result = get_pwd_context().verify(*args)
+    return result, started - queued_at, time.monotonic() - started
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool.
+
+    At most ``max_pending`` jobs may be queued or running; beyond that callers
+    get a 503 with ``Retry-After`` instead of piling up behind a login storm.
+    Successful verifications are remembered for ``cache_ttl`` seconds, keyed
+    by an HMAC of the stored hash and the password, so repeated logins skip
+    bcrypt and a password change invalidates the entry by itself.
+    """
+
+    def __init__(
+        self,
+        pool: str = "thread",
+        workers: int = 4,
+        max_pending: int = 64,
+        cache_ttl: int = 300,
+        cache_size: int = 10000,
+    ):
+        self.pool = pool
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._cache = TTLCache(cache_size, cache_ttl) if cache_ttl > 0 else None
+        self._cache_key = secrets.token_bytes(32)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _submit(self, operation: str, *args):
+        if self._pending >= self.max_pending:
+            hash_rejected.inc(operation)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        hash_pending.set(self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            result, waited, took = await loop.run_in_executor(
+                self._get_executor(), _run, operation, time.monotonic(), *args
+            )
+        finally:
+            self._pending -= 1
+            hash_pending.set(self._pending)
+        hash_queue_wait.observe(waited, operation)
+        hash_duration.observe(took, operation)
+        return result
+
+    def _credential_key(self, password: str, hashed_password: str) -> bytes:
+        message = hashed_password.encode() + b"\0" + password.encode()
+        return hmac.new(self._cache_key, message, hashlib.sha256).digest()
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        key = None
+        if self._cache is not None:
+            key = self._credential_key(password, hashed_password)
+            if key in self._cache:
+                credential_cache_hits.inc()
+                return True
+        verified = await self._submit("verify", password, hashed_password)
+        if verified and key is not None:
+            self._cache.set(key, True)
+        return verified
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    pool=config.HASH_POOL,
+    workers=config.HASH_WORKERS,
+    max_pending=config.HASH_MAX_PENDING,
+    cache_ttl=config.CREDENTIAL_CACHE_TTL,
+    cache_size=config.CREDENTIAL_CACHE_SIZE,
+)
@@ -0,0 +1,173 @@
+import json
+import math
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from utils.cache import TTLCache
+from utils.metrics import Counter
+
+rate_limited = Counter(
+    "rate_limited_requests_total", "Requests refused by the rate limiter by reason (rate/concurrency)",
+    ["route", "reason"],
+)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Verified bearer tokens are remembered this long, a JWT check costs more than the rest of the limiter
+IDENTITY_TTL = 60
+
+
+class RateLimiter:
+    """Token bucket per client plus a cap on the requests in flight.
+
+    A bucket holds up to ``burst`` tokens and refills at ``rate`` tokens per
+    second; a request takes the cost of its route. Only one float is kept
+    per client: the moment its bucket is full again. The entries live in a
+    bounded ``TTLCache`` and expire at that moment, so only clients that
+    spent tokens recently take memory, and when ``maxsize`` is reached the
+    least recently seen client is forgotten (it starts again with a full
+    bucket).
+    """
+
+    def __init__(self, rate: float, burst: float, maxsize: int = 100000,
+                 write_cost: float = 1, max_concurrency: int = 0):
+        self.rate = rate
+        self.burst = burst
+        self.write_cost = write_cost
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._full_at = TTLCache(maxsize, burst / rate) if rate > 0 else None
+        self._identities = TTLCache(maxsize, IDENTITY_TTL)
+        self._static: Dict[Tuple[str, str], float] = {}
+        self._patterns: List[Tuple[str, str, re.Pattern, float]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.limits_rate or self.max_concurrency > 0
+
+    @property
+    def limits_rate(self) -> bool:
+        return self._full_at is not None
+
+    def route_cost(self, method: str, path: str, cost: float):
+        """Sets the cost of a route, ``path`` may contain ``{param}`` segments.
+
+        Unregistered routes cost 1, or ``write_cost`` for methods other than
+        GET/HEAD/OPTIONS. Cost 0 exempts the route from the buckets and from
+        the concurrency cap (long-lived streams, health checks).
+        """
+        if "{" not in path:
+            self._static[method, path] = cost
+            return
+        regex = re.sub(r"\{(\w+)\}", r"[^/]+", path)
+        self._patterns.append((method, path, re.compile(f"^{regex}$"), cost))
+
+    def cost(self, method: str, path: str) -> Tuple[str, float]:
+        """The route label (for the metrics) and the cost of a request."""
+        cost = self._static.get((method, path))
+        if cost is not None:
+            return path, cost
+        for route_method, template, pattern, cost in self._patterns:
+            if route_method == method and pattern.match(path):
+                return template, cost
+        return "other", 1 if method in SAFE_METHODS else self.write_cost
+
+    def take(self, key: str, cost: float) -> float:
+        """Takes ``cost`` tokens from the bucket of ``key``.
+
+        Returns 0 when the request may go on, otherwise the seconds until the
+        bucket holds enough tokens (nothing is taken then).
+        """
+        now = time.monotonic()
+        interval = min(cost, self.burst) / self.rate
+        full_at = max(self._full_at.get(key, now), now) + interval
+        wait = full_at - now - self.burst / self.rate
+        if wait > 0:
+            return wait
+        self._full_at.set(key, full_at, full_at - now)
+        return 0
+
+    def client_key(self, scope, identify: Optional[Callable[[str], object]]) -> str:
+        """The user id of a valid bearer token, or the client IP.
+
+        Invalid tokens count against the IP, so made-up tokens do not get
+        fresh buckets. Behind a proxy, run uvicorn with ``--proxy-headers``
+        so that the client address is the real one.
+        """
+        if identify is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer" and token:
+                        user_key = self._identities.get(token)
+                        if user_key is None:
+                            token_data = identify(token)
+                            if token_data is not None:
+                                user_key = f"user:{token_data.user_id}"
+                                self._identities.set(token, user_key)
+                        if user_key is not None:
+                            return user_key
+                    break
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:-"
+
+
+class RateLimitMiddleware:
+    """Sheds load before routing: 503 when the worker already has
+    ``max_concurrency`` requests in flight, 429 when the client's bucket is
+    empty. Both carry ``Retry-After``.
+
+    ``identify(token)`` validates a bearer token and returns an object with
+    ``user_id``, or None.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, identify: Optional[Callable[[str], object]] = None):
+        self.app = app
+        self.limiter = limiter
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if scope["type"] != "http" or not limiter.enabled:
+            return await self.app(scope, receive, send)
+        route, cost = limiter.cost(scope["method"], scope["path"])
+        if cost == 0:
+            return await self.app(scope, receive, send)
+
+        if limiter.max_concurrency and limiter.in_flight >= limiter.max_concurrency:
+            rate_limited.inc(route, "concurrency")
+            return await refuse(send, 503, "Server busy, try again later", 1)
+        wait = limiter.take(limiter.client_key(scope, self.identify), cost) if limiter.limits_rate else 0
+        if wait:
+            rate_limited.inc(route, "rate")
+            return await refuse(send, 429, "Too many requests", wait)
+
+        limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
+
+
+async def refuse(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+rate_limiter = RateLimiter(
+    config.RATE_LIMIT_PER_SECOND if config.RATE_LIMIT_ENABLED else 0,
+    config.RATE_LIMIT_BURST,
+    maxsize=config.RATE_LIMIT_CLIENTS,
+    write_cost=config.RATE_LIMIT_WRITE_COST,
+    max_concurrency=config.MAX_CONCURRENT_REQUESTS,
+)
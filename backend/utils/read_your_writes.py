@@ -0,0 +1,84 @@
+import hashlib
+import time
+from http.cookies import SimpleCookie
+
+import config
+from utils.cache import TTLCache
+
+COOKIE_NAME = "read_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class WriteTracker:
+    """Remembers which clients wrote in the last ``window`` seconds.
+
+    Those clients read from the primary instead of the read engine, so a
+    vote or an edit is visible to its author at once even on a lagging
+    replica. A client is its bearer token, or its IP without one. The
+    memory is per worker; the cookie set on the write response carries the
+    deadline to the other workers for clients that keep cookies.
+    """
+
+    def __init__(self, window: float, maxsize: int = 100000):
+        self.window = window
+        self._writers = TTLCache(maxsize, window) if window > 0 else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._writers is not None
+
+    @staticmethod
+    def client_key(scope) -> bytes:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                return hashlib.blake2b(value, digest_size=16).digest()
+        client = scope.get("client")
+        return client[0].encode() if client else b"-"
+
+    def record(self, scope):
+        if self.enabled:
+            self._writers.set(self.client_key(scope), True)
+
+    def wrote_recently(self, scope) -> bool:
+        if not self.enabled:
+            return False
+        if self.client_key(scope) in self._writers:
+            return True
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                morsel = SimpleCookie(value.decode("latin-1")).get(COOKIE_NAME)
+                if morsel is not None:
+                    try:
+                        return float(morsel.value) > time.time()
+                    except ValueError:
+                        return False
+        return False
+
+    def cookie_header(self) -> bytes:
+        until = time.time() + self.window
+        return f"{COOKIE_NAME}={until:.3f}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax".encode()
+
+
+class ReadYourWritesMiddleware:
+    """Records the clients of successful writes in the tracker."""
+
+    def __init__(self, app, tracker: WriteTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not self.tracker.enabled:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                self.tracker.record(scope)
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", self.tracker.cookie_header())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# A read-only connection to the same SQLite file sees every commit at once,
+# only a separate read database (a replica) can lag behind
+write_tracker = WriteTracker(config.READ_YOUR_WRITES_SECONDS if config.READ_DATABASE_URL else 0)
@@ -0,0 +1,134 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+from utils.metrics import Counter, Gauge, Histogram
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body",
+    ["method", "route"],
+)
+requests_total = Counter("http_requests_total", "Requests by method, route and status code", ["method", "route", "status"])
+requests_in_progress = Gauge("http_requests_in_progress", "Requests being handled")
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements issued while handling one request",
+    ["route"], buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_time = Histogram("http_request_db_seconds", "Time spent in SQL statements per request", ["route"])
+query_duration = Histogram("db_query_duration_seconds", "Duration of single SQL statements", ["statement"])
+slow_queries = Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS", ["statement"])
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_time: float = 0.0
+
+
+# Set by the middleware for the duration of a request; statements run by
+# background tasks (e.g. the batched vote writer) are not attributed to one
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _statement_kind(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+
+def instrument_engine(engine: Engine):
+    """Times every statement of ``engine`` (for async engines pass ``.sync_engine``)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        took = time.perf_counter() - conn.info["query_started"].pop()
+        kind = _statement_kind(statement)
+        query_duration.observe(took, kind)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += took
+        if took * 1000 >= config.SLOW_QUERY_MS:
+            slow_queries.inc(kind)
+            logger.warning(f"Slow query ({took * 1000:.1f} ms): {statement[:config.SLOW_QUERY_LOG_CHARS]}")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+def route_label(scope) -> str:
+    """Route template (``/referendums/{referendum_id}/results``), never the raw path."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Set by the response cache, whose hits never reach the router
+    return scope.get("route_template", "unmatched")
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL usage of every HTTP request.
+
+    With ``server_timing`` the response also gets a ``Server-Timing`` header
+    (``app`` and ``db`` durations, query count) for the browser dev tools.
+    """
+
+    def __init__(self, app, server_timing: bool = False, query_warn: int = 0):
+        self.app = app
+        self.server_timing = server_timing
+        self.query_warn = query_warn
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    took = (time.perf_counter() - started) * 1000
+                    timing = (
+                        f'app;dur={took:.1f}, db;dur={stats.query_time * 1000:.1f};desc="{stats.queries} queries"'
+                    )
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode())
+                    ])
+            await send(message)
+
+        requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_progress.inc(amount=-1)
+            _current.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            request_duration.observe(time.perf_counter() - started, method, route)
+            requests_total.inc(method, route, str(status_code))
+            request_queries.observe(stats.queries, route)
+            request_db_time.observe(stats.query_time, route)
+            if self.query_warn and stats.queries > self.query_warn:
+                logger.warning(f"{method} {route} issued {stats.queries} SQL statements (possible N+1)")
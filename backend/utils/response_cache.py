@@ -0,0 +1,239 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from loguru import logger
+
+import config
+from utils.cache import TTLCache
+from utils.metrics import Counter
+
+cache_requests = Counter(
+    "response_cache_requests_total", "Cacheable GET requests by outcome (hit/miss/not_modified/bypass/error)",
+    ["route", "outcome"],
+)
+
+# Response headers worth replaying from the cache
+STORED_HEADERS = (b"content-type", b"x-next-cursor")
+
+
+class MemoryBackend:
+    """Per-process backend: entries in an LRU with TTL, generations in a dict."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries.set(key, value, ttl)
+
+    async def generations(self, namespaces: List[str]) -> List[int]:
+        return [self._generations.get(namespace, 0) for namespace in namespaces]
+
+    async def bump(self, namespaces: Iterable[str]):
+        for namespace in namespaces:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Shared backend for several workers; any server speaking the Redis protocol works."""
+
+    def __init__(self, url: str, prefix: str = "rc"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE=redis requires the 'redis' package") from e
+        self._client = redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(f"{self._prefix}:entry:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(f"{self._prefix}:entry:{key}", value, px=int(ttl * 1000))
+
+    async def generations(self, namespaces: List[str]) -> List[int]:
+        values = await self._client.mget([f"{self._prefix}:gen:{namespace}" for namespace in namespaces])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, namespaces: Iterable[str]):
+        async with self._client.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.incr(f"{self._prefix}:gen:{namespace}")
+            await pipe.execute()
+
+
+@dataclass
+class CachedRoute:
+    name: str
+    pattern: re.Pattern
+    # (path params, query params) -> namespaces the response depends on
+    namespaces: Callable[[Dict[str, str], Dict[str, str]], List[str]]
+
+
+class ResponseCache:
+    """Caches serialized GET responses of registered routes.
+
+    Every entry depends on one or more namespaces (e.g. "referendums",
+    "tags"). Each namespace has a generation counter that is part of the cache
+    key, so ``invalidate`` only bumps counters: stale entries become
+    unreachable at once and age out through the TTL. The generations are read
+    before the handler runs, which means a write racing with a miss can only
+    store an entry that nobody will look up again.
+    """
+
+    def __init__(self, backend=None, ttl: float = 30):
+        self.backend = backend
+        self.ttl = ttl
+        self._routes: List[CachedRoute] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def cache_route(self, path: str, namespaces: Callable[[Dict[str, str], Dict[str, str]], List[str]]):
+        """Registers a GET route, ``path`` may contain ``{param}`` segments."""
+        regex = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path)
+        self._routes.append(CachedRoute(path, re.compile(f"^{regex}$"), namespaces))
+
+    def match(self, path: str) -> Optional[Tuple[CachedRoute, Dict[str, str]]]:
+        for route in self._routes:
+            found = route.pattern.match(path)
+            if found:
+                return route, found.groupdict()
+        return None
+
+    async def key(self, path: str, query: List[Tuple[str, str]], namespaces: List[str]) -> str:
+        generations = await self.backend.generations(namespaces)
+        versions = ",".join(f"{namespace}={generation}" for namespace, generation in zip(namespaces, generations))
+        return f"{path}?{urlencode(sorted(query))}#{versions}"
+
+    async def invalidate(self, *namespaces: str):
+        if not self.enabled or not namespaces:
+            return
+        try:
+            await self.backend.bump(namespaces)
+        except Exception as e:
+            logger.warning(f"Response cache invalidation of {namespaces} failed: {e}")
+
+
+def encode_entry(headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    header_blob = json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers])
+    return header_blob.encode("latin-1") + b"\n" + body
+
+
+def decode_entry(entry: bytes) -> Tuple[List[Tuple[bytes, bytes]], bytes]:
+    header_blob, body = entry.split(b"\n", 1)
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(header_blob)]
+    return headers, body
+
+
+def etag_for(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=12).hexdigest().encode() + b'"'
+
+
+def etag_matches(if_none_match: Optional[bytes], etag: bytes) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(b",")]
+    return b"*" in candidates or etag in candidates or b"W/" + etag in candidates
+
+
+class ResponseCacheMiddleware:
+    """Serves registered GET routes from the cache as ready-made JSON bytes.
+
+    Hits never reach routing, dependencies or serialization. Each response
+    gets an ETag, and a matching ``If-None-Match`` is answered with 304.
+    Requests for which ``bypass(scope)`` is true skip the cache altogether
+    (clients that just wrote and must see their change).
+    """
+
+    def __init__(self, app, cache: ResponseCache, bypass: Optional[Callable[[dict], bool]] = None):
+        self.app = app
+        self.cache = cache
+        self.bypass = bypass
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not self.cache.enabled:
+            return await self.app(scope, receive, send)
+        matched = self.cache.match(scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+
+        route, path_params = matched
+        scope["route_template"] = route.name
+        if self.bypass is not None and self.bypass(scope):
+            cache_requests.inc(route.name, "bypass")
+            return await self.app(scope, receive, send)
+        query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        try:
+            key = await self.cache.key(scope["path"], query, route.namespaces(path_params, dict(query)))
+            entry = await self.cache.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed, bypassing: {e}")
+            cache_requests.inc(route.name, "error")
+            return await self.app(scope, receive, send)
+
+        if entry is not None:
+            headers, body = decode_entry(entry)
+            outcome = await self._send(send, headers, body, if_none_match, b"HIT")
+            cache_requests.inc(route.name, outcome)
+            return
+
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        if start.get("status") != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = [(name, value) for name, value in start.get("headers", []) if name.lower() in STORED_HEADERS]
+        headers.append((b"etag", etag_for(body)))
+        try:
+            await self.cache.backend.set(key, encode_entry(headers, body), self.cache.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+        outcome = await self._send(send, headers, body, if_none_match, b"MISS")
+        cache_requests.inc(route.name, "miss" if outcome == "hit" else outcome)
+
+    async def _send(self, send, headers, body: bytes, if_none_match: Optional[bytes], cache_status: bytes) -> str:
+        etag = next(value for name, value in headers if name == b"etag")
+        headers = headers + [
+            (b"cache-control", b"no-cache"),
+            (b"x-cache", cache_status),
+        ]
+        if etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return "not_modified"
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return "hit"
+
+
+def build_backend():
+    if config.RESPONSE_CACHE == "memory":
+        return MemoryBackend(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+    if config.RESPONSE_CACHE == "redis":
+        return RedisBackend(config.RESPONSE_CACHE_URL)
+    return None
+
+
+response_cache = ResponseCache(build_backend(), ttl=config.RESPONSE_CACHE_TTL)
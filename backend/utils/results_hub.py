@@ -0,0 +1,212 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+
+from utils.metrics import Counter, Gauge
+
+stream_subscribers = Gauge("results_stream_subscribers", "Open live result streams")
+stream_updates = Counter("results_stream_updates_total", "Result updates serialized and fanned out")
+
+# referendum_id -> (yes_count, no_count)
+Tallies = Dict[int, Tuple[int, int]]
+
+
+class HubFullError(Exception):
+    """Too many open streams on this worker."""
+
+
+@dataclass
+class Update:
+    """One tally update, serialized once and shared by every subscriber."""
+    json: bytes
+    sse: bytes
+
+    @classmethod
+    def build(cls, referendum_id: int, yes_count: int, no_count: int, delta: Tuple[int, int]) -> "Update":
+        payload = json.dumps({
+            "referendum_id": referendum_id,
+            "yes_count": yes_count,
+            "no_count": no_count,
+            "total": yes_count + no_count,
+            "delta": {"yes_count": delta[0], "no_count": delta[1]},
+        }, separators=(",", ":")).encode()
+        return cls(json=payload, sse=b"event: results\ndata: " + payload + b"\n\n")
+
+
+class Subscription:
+    """Latest-value mailbox of one watcher.
+
+    Only the newest update is kept: a slow client skips intermediate tallies
+    instead of queueing them, which is fine because every update carries the
+    absolute counts. Iterating yields ``None`` every ``keepalive`` seconds
+    without news, so the transport can send a heartbeat.
+    """
+
+    def __init__(self, hub: "ResultsHub", referendum_id: int, keepalive: float):
+        self.hub = hub
+        self.referendum_id = referendum_id
+        self.keepalive = keepalive
+        self._update: Optional[Update] = None
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def push(self, update: Update):
+        self._update = update
+        self._ready.set()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._ready.set()
+            self.hub.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Optional[Update]:
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.keepalive)
+        except asyncio.TimeoutError:
+            return None
+        if self._closed:
+            raise StopAsyncIteration
+        self._ready.clear()
+        return self._update
+
+
+@dataclass
+class Channel:
+    subscribers: Set[Subscription] = field(default_factory=set)
+    counts: Optional[Tuple[int, int]] = None
+    last: Optional[Update] = None
+
+
+class ResultsHub:
+    """In-process pub/sub of referendum tallies for the live result streams.
+
+    Vote commits only mark their referendums dirty; a single loop then reloads
+    the dirty tallies at most ``max_rate`` times per second in one query and
+    fans the serialized update out to every watcher. The database cost
+    therefore depends on the number of changing referendums, never on the
+    number of watchers. Every ``poll_interval`` seconds all watched tallies
+    are reloaded as well, which picks up votes committed by other workers.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Iterable[int]], Awaitable[Tallies]],
+        max_rate: float = 2,
+        poll_interval: float = 2,
+        keepalive: float = 15,
+        max_subscribers: int = 10000,
+    ):
+        self.loader = loader
+        self.interval = 1 / max_rate
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self._channels: Dict[int, Channel] = {}
+        self._dirty: Set[int] = set()
+        self._subscriber_count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def full(self) -> bool:
+        return self._subscriber_count >= self.max_subscribers
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="results-hub")
+
+    async def stop(self):
+        """Ends every open stream and stops the refresh loop."""
+        for channel in list(self._channels.values()):
+            for subscription in list(channel.subscribers):
+                subscription.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def subscribe(self, referendum_id: int) -> Subscription:
+        if self.full:
+            raise HubFullError()
+        self.start()
+        subscription = Subscription(self, referendum_id, self.keepalive)
+        channel = self._channels.get(referendum_id)
+        is_new = channel is None
+        if is_new:
+            channel = self._channels[referendum_id] = Channel()
+        channel.subscribers.add(subscription)
+        self._subscriber_count += 1
+        stream_subscribers.set(self._subscriber_count)
+        if channel.last is not None:
+            subscription.push(channel.last)
+        elif is_new:
+            # Whoever opens the channel loads its first snapshot for everyone
+            try:
+                await self._refresh([referendum_id])
+            except BaseException:
+                # Streams that joined meanwhile get the snapshot from the refresh loop
+                self.unsubscribe(subscription)
+                if referendum_id in self._channels:
+                    self._dirty.add(referendum_id)
+                raise
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        channel = self._channels.get(subscription.referendum_id)
+        if channel is None or subscription not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscription)
+        self._subscriber_count -= 1
+        stream_subscribers.set(self._subscriber_count)
+        if not channel.subscribers:
+            del self._channels[subscription.referendum_id]
+
+    async def notify(self, tallies: Dict[int, list]):
+        """Vote writer listener: marks the watched referendums of a commit dirty."""
+        self._dirty.update(referendum_id for referendum_id in tallies if referendum_id in self._channels)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time() + self.poll_interval
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.poll_interval > 0 and loop.time() >= next_poll:
+                next_poll = loop.time() + self.poll_interval
+                self._dirty.update(self._channels)
+            if not self._dirty:
+                continue
+            referendum_ids, self._dirty = self._dirty, set()
+            try:
+                await self._refresh(referendum_ids)
+            except Exception as e:
+                logger.warning(f"Refreshing live results failed: {e}")
+                self._dirty.update(referendum_ids)
+
+    async def _refresh(self, referendum_ids: Iterable[int]):
+        referendum_ids = [referendum_id for referendum_id in referendum_ids if referendum_id in self._channels]
+        if not referendum_ids:
+            return
+        tallies = await self.loader(referendum_ids)
+        for referendum_id in referendum_ids:
+            channel = self._channels.get(referendum_id)
+            if channel is None:
+                continue
+            counts = tallies.get(referendum_id, (0, 0))
+            if counts == channel.counts:
+                continue
+            previous = channel.counts or counts
+            delta = (counts[0] - previous[0], counts[1] - previous[1])
+            channel.counts = counts
+            channel.last = Update.build(referendum_id, counts[0], counts[1], delta)
+            stream_updates.inc()
+            for subscription in channel.subscribers:
+                subscription.push(channel.last)
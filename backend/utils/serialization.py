@@ -0,0 +1,35 @@
+import json
+from typing import Any, Iterable, List, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used without it
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes in the format of the response models: compact, UTF-8,
+    ISO 8601 datetimes (UTC as ``Z``)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: List[str]) -> List[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def encode_items(items: List[dict], adapter: Optional[TypeAdapter] = None) -> bytes:
+    """Encodes plain dicts, validated in one call by ``adapter`` when given.
+
+    Rows straight from the database are trusted and usually go without an
+    adapter; validation catches a schema that drifted from the columns.
+    """
+    if adapter is None:
+        return dumps(items)
+    return adapter.dump_json(adapter.validate_python(items))
@@ -0,0 +1,30 @@
+import json
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupTimer:
+    """Wall-clock phases of a worker's startup, from the first line of
+    main.py until the lifespan is ready to serve."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """Ends ``phase`` (which began with the previous mark) now."""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (self._last - self.started) * 1000
+
+    def report(self, budget_ms: float) -> str:
+        return json.dumps({
+            "total_ms": round(self.elapsed_ms, 1),
+            "budget_ms": budget_ms,
+            "phases_ms": {phase: round(duration, 1) for phase, duration in self.phases},
+        })
@@ -22,6 +22,10 @@ export const getReferendums = async (params = {}) => {
   return API.get('/referendums/', { params });
 };
 
+export const searchReferendums = async (q, params = {}) => {
+  return API.get('/referendums/search', { params: { ...params, q } });
+};
+
 export const getReferendumById = async (id) => {
   return API.get('/referendums/', { params: { referendum_id: id } });
 };
@@ -46,6 +50,47 @@ export const getVotesByReferendumId = async (referendumId) => {
   }
 };
 
+export const getReferendumResults = async (referendumId) => {
+  return API.get(`/referendums/${referendumId}/results`);
+};
+
+export const getReferendumsResults = async (referendumIds) => {
+  return API.get('/referendums/results', { params: { ids: referendumIds.join(',') } });
+};
+
+export const getVotesByUserId = async (userId, params = {}) => {
+  try {
+    const response = await API.get('/votes/', { params: { ...params, user_id: userId } });
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching votes", error);
+    return [];
+  }
+};
+
+// The server takes at most 500 ids per request
+const VOTES_BATCH = 500;
+
+export const getVotedReferendumIds = async (userId, referendumIds) => {
+  try {
+    const batches = [];
+    for (let i = 0; i < referendumIds.length; i += VOTES_BATCH) {
+      batches.push(API.get('/votes/', {
+        params: {
+          user_id: userId,
+          referendum_ids: referendumIds.slice(i, i + VOTES_BATCH).join(','),
+          fields: 'referendum_id'
+        }
+      }));
+    }
+    const responses = await Promise.all(batches);
+    return new Set(responses.flatMap(response => response.data.map(v => v.referendum_id)));
+  } catch (error) {
+    console.error("Error fetching votes", error);
+    return new Set();
+  }
+};
+
 export const createVote = async (voteData) => {
   return API.post('/votes/', voteData);
 };
@@ -70,8 +115,8 @@ export const updateUser = async (id, data) => {
   return API.patch(`/users/`, data, { params: { user_id: id } });
 };
 
-export const getTags = async () => {
-  return API.get('/tags/');
+export const getTags = async (params = {}) => {
+  return API.get('/tags/', { params });
 };
 
 export const createTag = async (tag_name) => {
@@ -86,6 +131,10 @@ export const getTagsByReferendumId = async (referendum_id) => {
   return API.get(`/tags/referendum/${referendum_id}`);
 };
 
+export const getTagsByReferendumIds = async (ids) => {
+  return API.get('/tags/referendums', { params: { ids: ids.join(',') } });
+};
+
 export const addTagToReferendum = async (referendum_id, tag_id) => {
   return API.post('/tags/referendum/', {
     referendum_id,
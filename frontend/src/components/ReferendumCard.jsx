@@ -1,15 +1,15 @@
 import { useEffect, useState } from 'react';
 import { formatDateOnly } from '../utils/dateFormatter';
 import { useAuth } from '../context/AuthContext';
-import { getTagsByReferendumId, getVotesByReferendumId, createVote } from '../api';
+import { getTagsByReferendumId, getReferendumResults, createVote } from '../api';
 
 
-export default function ReferendumCard({ referendum }) {
-  const [votes, setVotes] = useState([]);
+export default function ReferendumCard({ referendum, voted = false }) {
+  const [results, setResults] = useState(referendum.results || { yes_count: 0, no_count: 0 });
   const [loading, setLoading] = useState(true);
-  const [hasVoted, setHasVoted] = useState(false);
+  const [hasVoted, setHasVoted] = useState(voted);
   const [voteError, setVoteError] = useState('');
-  const [tags, setTags] = useState([]);
+  const [tags, setTags] = useState(referendum.tags || []);
   const { user } = useAuth();
 
   const now = new Date();
@@ -23,21 +23,22 @@ export default function ReferendumCard({ referendum }) {
     now >= startDate &&
     now <= endDate;
 
+  // The list looks up the user's votes for all cards at once
+  useEffect(() => {
+    setHasVoted(voted);
+  }, [voted]);
+
   useEffect(() => {
     const fetchVotesAndTags = async () => {
       try {
-        const [voteData, tagResponse] = await Promise.all([
-          getVotesByReferendumId(referendum.id),
-          getTagsByReferendumId(referendum.id)
+        // Lists loaded with expand=tags,results already carry both
+        const [resultsResponse, tagResponse] = await Promise.all([
+          referendum.results ? null : getReferendumResults(referendum.id),
+          referendum.tags ? null : getTagsByReferendumId(referendum.id)
         ]);
 
-        setVotes(voteData);
-        setTags(tagResponse.data.tags || []);
-
-        if (user) {
-          const voted = voteData.some(v => v.user_id === user.id);
-          setHasVoted(voted);
-        }
+        if (resultsResponse) setResults(resultsResponse.data);
+        if (tagResponse) setTags(tagResponse.data.tags || []);
       } catch (error) {
         console.error('Failed to fetch votes or tags:', error);
       } finally {
@@ -48,8 +49,8 @@ export default function ReferendumCard({ referendum }) {
     fetchVotesAndTags();
   }, [referendum.id, user]);
 
-  const votesFor = votes.filter(v => v.vote_value === true).length;
-  const votesAgainst = votes.filter(v => v.vote_value === false).length;
+  const votesFor = results.yes_count;
+  const votesAgainst = results.no_count;
 
   const handleVote = async (voteValue) => {
     try {
@@ -60,8 +61,8 @@ export default function ReferendumCard({ referendum }) {
       setHasVoted(true);
       setVoteError('');
 
-      const updatedVotes = await getVotesByReferendumId(referendum.id);
-      setVotes(updatedVotes);
+      const updatedResults = await getReferendumResults(referendum.id);
+      setResults(updatedResults.data);
     } catch (error) {
       console.error('Vote failed:', error);
       if (error.response?.data?.detail) {
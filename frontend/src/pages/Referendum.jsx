@@ -1,45 +1,52 @@
 import { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
-import { getReferendums, getUserReferendums, getTagsByReferendumId } from '../api';
+import { getReferendums, getUserReferendums, getVotedReferendumIds, searchReferendums } from '../api';
 import ReferendumCard from '../components/ReferendumCard';
 
 export default function Referendums() {
   const { user } = useAuth();
   const [referendums, setReferendums] = useState([]);
+  const [votedIds, setVotedIds] = useState(new Set());
   const [loading, setLoading] = useState(true);
   const [filters, setFilters] = useState({
     search: '',
     showMineOnly: false,
     status: 'all'
   });
+  const [searchQuery, setSearchQuery] = useState('');
+
+  // Plain words are searched on the server (full-text, all referendums);
+  // #tag and "mine only" keep filtering the loaded list
+  const term = filters.search.trim();
+  const serverSearch = term && !term.startsWith('#') && !filters.showMineOnly ? term : '';
+
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(serverSearch), 300);
+    return () => clearTimeout(timer);
+  }, [serverSearch]);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         setLoading(true);
         let response;
+        // Tags and vote counts come embedded, no per-card requests needed
+        const params = { expand: 'creator,tags,results' };
 
         if (filters.showMineOnly && user) {
-          response = await getUserReferendums(user.id, { expand: 'creator' });
+          response = await getUserReferendums(user.id, params);
+        } else if (searchQuery) {
+          response = await searchReferendums(searchQuery, params);
         } else {
-          response = await getReferendums({ expand: 'creator' });
+          response = await getReferendums(params);
         }
 
-        const refs = response.data;
-        
-        const withTags = await Promise.all(
-          refs.map(async (r) => {
-            try {
-              const tagsRes = await getTagsByReferendumId(r.id);
-              const tagNames = (tagsRes.data.tags || []).map(t => t.name.toLowerCase());
-              return { ...r, tags: tagNames };
-            } catch {
-              return { ...r, tags: [] };
-            }
-          })
-        );
-
-        setReferendums(withTags);
+        // One request for the user's votes on every card instead of one per card
+        const voted = user && response.data.length
+          ? await getVotedReferendumIds(user.id, response.data.map(ref => ref.id))
+          : new Set();
+        setVotedIds(voted);
+        setReferendums(response.data);
       } catch (error) {
         console.error('Error fetching referendums:', error);
       } finally {
@@ -48,17 +55,17 @@ export default function Referendums() {
     };
 
     fetchData();
-  }, [filters.showMineOnly, user]);
+  }, [filters.showMineOnly, user, searchQuery]);
 
   const filteredReferendums = referendums.filter(ref => {
     const term = filters.search.trim().toLowerCase();
 
     if (term.startsWith('#')) {
       const tagSearch = term.slice(1);
-      if (!ref.tags || !ref.tags.includes(tagSearch)) {
+      if (!ref.tags || !ref.tags.some(tag => tag.name.toLowerCase() === tagSearch)) {
         return false;
       }
-    } else if (term) {
+    } else if (term && !searchQuery) {
       const inTitle = ref.title.toLowerCase().includes(term);
       const inDesc = ref.description.toLowerCase().includes(term);
       if (!inTitle && !inDesc) {
@@ -114,7 +121,7 @@ export default function Referendums() {
         <div style={{ display: 'grid', gap: '1rem' }}>
           {filteredReferendums.length > 0 ? (
             filteredReferendums.map((referendum) => (
-              <ReferendumCard key={referendum.id} referendum={referendum} />
+              <ReferendumCard key={referendum.id} referendum={referendum} voted={votedIds.has(referendum.id)} />
             ))
           ) : (
             <p>No referendums found</p>
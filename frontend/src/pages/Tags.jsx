@@ -21,7 +21,7 @@ export default function Tags() {
     const fetchTags = async () => {
       try {
         setLoading(true);
-        const res = await getTags();
+        const res = await getTags({ with_counts: true });
         setTags(res.data);
       } catch (err) {
         console.error('Failed to fetch tags:', err);
@@ -123,6 +123,7 @@ export default function Tags() {
           }}>
             <div>
               <p><strong>{t.name}</strong></p>
+              <p style={{ color: '#666', fontSize: '0.9rem' }}>{t.referendum_count ?? 0} referendums</p>
             </div>
             <button
               onClick={() => handleDelete(t.id)}